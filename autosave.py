@@ -0,0 +1,369 @@
+import os
+import json
+import queue
+import hashlib
+import threading
+
+from text_buffer import TextBuffer
+
+AUTOSAVE_INTERVAL = 3.0
+MAX_JOURNAL_BYTES = 4 * 1024 * 1024
+
+
+def snapshot_pieces(snapshot):
+    # Куски текста снимка TextBuffer; между блоками стоит '\n'
+    for i, piece in enumerate(snapshot):
+        if i:
+            yield '\n'
+        if isinstance(piece, str):
+            yield piece
+        elif isinstance(piece, list):
+            yield '\n'.join(piece)
+        else:
+            yield piece.text()
+
+
+def write_atomic(path, pieces):
+    # Пишем во временный файл рядом с целевым и подменяем его через os.replace:
+    # при сбое на диске остается либо старая, либо новая версия целиком
+    digest = hashlib.sha256()
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for piece in pieces:
+                data = piece.encode('utf-8')
+                digest.update(data)
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_text(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+
+def read_journal(path):
+    # Заголовок и операции журнала; оборванная последняя запись отбрасывается
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().split('\n')
+    except OSError:
+        return None, []
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return None, []
+    ops = []
+    for line in lines[1:]:
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            break
+    return header, ops
+
+
+def replay(text, ops):
+    buffer = TextBuffer.from_text(text)
+    for op in ops:
+        if op['op'] == 'i':
+            buffer.insert_text(op['r'], op['c'], op['t'])
+        elif op['op'] == 'd':
+            buffer.delete_text(op['r'], op['c'], op['er'], op['ec'])
+        elif op['op'] == 'r':
+            buffer.replace_lines(dict(zip(op['rows'], op['t'])))
+        elif op['op'] == 'lines':
+            buffer.set_lines(op['t'].split('\n'))
+    return buffer
+
+
+class SaveWriter:
+    # Поток записи на диск: задачи выполняются строго по очереди, поэтому
+    # дописывания в журнал не обгоняют сохранение, после которого они сделаны
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.messages = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):
+        self.jobs.put((func, args))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            func, args = job
+            try:
+                message = func(*args)
+                if message:
+                    self.messages.put(message)
+            except Exception as e:
+                self.messages.put(f"Error saving file: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def poll_messages(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def flush(self):
+        self.jobs.join()
+
+    def stop(self, timeout=5):
+        self.jobs.put(None)
+        self.thread.join(timeout)
+
+
+class AutoSaver:
+    # Сохранение файла и журнал правок. Журнал <файл>.journal начинается
+    # заголовком с базовым файлом и его sha256, дальше по строке JSON на
+    # правку. Автосохранение раз в несколько секунд дописывает только новые
+    # правки; разросшийся журнал сворачивается в снимок <файл>.autosave.
+    # Журнал создается первой правкой после открытия или сохранения и
+    # удаляется сохранением, поэтому после сохранения и чистого выхода
+    # рядом с файлом ничего не остается
+    def __init__(self, editor, untitled_path, interval=AUTOSAVE_INTERVAL, max_journal_bytes=MAX_JOURNAL_BYTES):
+        self.editor = editor
+        self.untitled_path = untitled_path
+        self.interval = interval
+        self.max_journal_bytes = max_journal_bytes
+        self.writer = SaveWriter()
+        self.path = None
+        self.pending = []
+        self.journal_bytes = 0
+        self.journal_started = False
+        # Заголовок будущего журнала; меняется только в потоке записи
+        self.journal_header = None
+        # Сохранение в фоне: пока его исход неизвестен, правки копятся в
+        # pending, а путь сессии до сохранения хранится на случай ошибки
+        self.saving = False
+        self.saved_from = None
+        self.save_results = queue.Queue()
+        self.timer = 0
+        os.makedirs(os.path.dirname(untitled_path), exist_ok=True)
+
+    @property
+    def session_path(self):
+        return self.path or self.untitled_path
+
+    @property
+    def journal_path(self):
+        return self.session_path + '.journal'
+
+    @property
+    def autosave_path(self):
+        return self.session_path + '.autosave'
+
+    # Правки редактора
+
+    def record_insert(self, row, col, text):
+        self.record({'op': 'i', 'r': row, 'c': col, 't': text})
+
+    def record_delete(self, row, col, end_row, end_col):
+        self.record({'op': 'd', 'r': row, 'c': col, 'er': end_row, 'ec': end_col})
+
+    def record_replace(self, changes):
+        self.record({'op': 'r', 'rows': list(changes), 't': list(changes.values())})
+
+    def record_lines(self, lines):
+        self.record({'op': 'lines', 't': lines.get_text()})
+
+    def record(self, op):
+        self.pending.append(op)
+
+    # Открытие и восстановление
+
+    def open(self, path=None, recover=True):
+        # Открывает файл (или безымянный буфер) и восстанавливает правки из
+        # журнала, оставшегося после аварийного завершения.
+        # Возвращает True, если буфер восстановлен из журнала
+        self.writer.flush()
+        self.finish_save()
+        self.editor.edit_listener = None
+        self.path = os.path.abspath(path) if path else None
+        self.pending = []
+        recovered = recover and self.recover()
+        if not recovered and path:
+            self.editor.load_file(path)
+        self.editor.edit_listener = self
+
+        if recovered:
+            # Восстановленный текст становится новым снимком журнала
+            self.compact()
+        else:
+            self.start_journal(self.path)
+        return recovered
+
+    def recover(self):
+        header, ops = read_journal(self.journal_path)
+        # Журнал без правок поверх самого файла восстанавливать не нужно,
+        # а поверх снимка .autosave - нужно
+        if header is None or (not ops and header.get('base') in (None, self.path)):
+            return False
+
+        base = header.get('base')
+        try:
+            if base is None:
+                text = ""
+            elif file_digest(base) == header.get('sha256'):
+                text = read_text(base)
+            else:
+                print(f"Journal {self.journal_path} does not match {base}, ignoring it")
+                return False
+            buffer = replay(text, ops)
+        except (OSError, KeyError, IndexError, TypeError) as e:
+            print(f"Error replaying journal {self.journal_path}: {e}")
+            return False
+
+        self.editor.lines = buffer
+        self.editor.cursor_pos = [0, 0]
+        print(f"Recovered {len(ops)} edits from {self.journal_path}")
+        return True
+
+    # Запись
+
+    def save(self, path):
+        # На UI-потоке только копируются ссылки на блоки буфера,
+        # сборка текста и запись выполняются в фоне
+        path = os.path.abspath(path)
+        if os.name == 'nt':
+            # В Windows нельзя подменить файл, пока он отображен в память
+            self.editor.lines.materialize()
+        # Исход предыдущего сохранения решает, куда идут правки до этого
+        if self.saving:
+            self.writer.flush()
+            self.finish_save()
+        # Правки до снимка дописываются в текущий журнал: если запись не
+        # удастся, он по-прежнему ведет к тексту буфера
+        self.flush_journal()
+        stale_paths = {self.journal_path, self.autosave_path}
+        self.saving = True
+        self.saved_from = self.path
+        self.path = path
+        stale_paths.update((self.journal_path, self.autosave_path))
+        self.writer.submit(self.write_file, path, self.editor.lines.snapshot(), sorted(stale_paths))
+
+    def finish_save(self):
+        try:
+            saved = self.save_results.get_nowait()
+        except queue.Empty:
+            return
+        self.saving = False
+        if saved:
+            # Правки после снимка начнут новый журнал от сохраненного файла
+            self.journal_bytes = 0
+            self.journal_started = False
+        else:
+            # Файл не записан: сессия остается прежней, а буфер целиком
+            # сворачивается в снимок .autosave вместо журнала, который к
+            # этому тексту уже не ведет
+            self.path = self.saved_from
+            self.compact()
+
+    def compact(self):
+        self.pending = []
+        self.journal_bytes = 0
+        self.journal_started = True
+        self.writer.submit(self.write_snapshot, self.autosave_path, self.editor.lines.snapshot(),
+                           self.journal_path)
+
+    def start_journal(self, base):
+        self.journal_bytes = 0
+        self.journal_started = False
+        self.writer.submit(self.set_journal_base, base, self.journal_path, self.autosave_path)
+
+    def flush_journal(self):
+        if not self.pending or self.saving:
+            return
+        data = ''.join(json.dumps(op) + '\n' for op in self.pending)
+        self.pending = []
+        self.journal_bytes += len(data)
+        if not self.journal_started:
+            self.journal_started = True
+            self.writer.submit(self.create_journal, self.journal_path)
+        self.writer.submit(self.append_journal, self.journal_path, data)
+        if self.journal_bytes > self.max_journal_bytes:
+            self.compact()
+
+    def update(self, dt):
+        self.finish_save()
+        self.timer += dt
+        if self.timer >= self.interval:
+            self.timer = 0
+            self.flush_journal()
+        for message in self.writer.poll_messages():
+            print(message)
+
+    def shutdown(self):
+        if self.saving:
+            self.writer.flush()
+            self.finish_save()
+        self.flush_journal()
+        if not self.journal_started:
+            # Чистый выход без несохраненных правок. Несохраненные правки
+            # остаются в журнале и восстановятся при следующем запуске
+            self.writer.submit(self.discard_files, self.journal_path, self.autosave_path)
+        self.writer.stop()
+        for message in self.writer.poll_messages():
+            print(message)
+
+    # Задачи потока записи
+
+    def write_file(self, path, snapshot, stale_paths):
+        # Исход сохранения уходит в UI-поток в любом случае, ошибку
+        # сообщает сам SaveWriter
+        saved = False
+        try:
+            digest = write_atomic(path, snapshot_pieces(snapshot))
+            saved = True
+            self.journal_header = {'base': path, 'sha256': digest}
+            # Файл записан целиком: журнал и снимок не нужны до следующей правки
+            self.discard_files(*stale_paths)
+        finally:
+            self.save_results.put(saved)
+        return f"Code saved as {path}"
+
+    def write_snapshot(self, path, snapshot, journal_path):
+        digest = write_atomic(path, snapshot_pieces(snapshot))
+        self.journal_header = {'base': path, 'sha256': digest}
+        # Журнал ведет к снимку несохраненных правок
+        write_atomic(journal_path, [json.dumps(self.journal_header) + '\n'])
+
+    def set_journal_base(self, base, journal_path, stale_path):
+        digest = file_digest(base) if base else None
+        self.journal_header = {'base': base, 'sha256': digest}
+        self.discard_files(journal_path, stale_path)
+
+    def create_journal(self, journal_path):
+        write_atomic(journal_path, [json.dumps(self.journal_header) + '\n'])
+
+    def append_journal(self, journal_path, data):
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def discard_files(self, *paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.unlink(path)
@@ -0,0 +1,195 @@
+# Пакетная проверка каталога скриптов игр без дисплея:
+#
+#     python batch_runner.py scripts/ --report report.jsonl
+#     python batch_runner.py scripts/ --report report.jsonl --changed-only
+#
+# Скрипты выполняются параллельно в пуле воркеров (по числу ядер) с таймаутом
+# и лимитами ресурсов на каждый. Результаты дописываются в JSONL-отчет по мере
+# завершения. С --frames игра останавливается после заданного числа кадров
+# (воспроизведение без ввода), иначе бесконечный игровой цикл упрется в таймаут.
+# --changed-only запускает только скрипты, у которых изменился хэш содержимого
+# или версия Python / pygame с прошлого отчета; остальные записи переносятся
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from worker_pool import WorkerPool
+from utils import read_json, discard_report
+
+STDERR_TAIL = 4000
+
+
+def runtime_version():
+    return f"python {sys.version.split()[0]}, pygame {pygame.version.ver}"
+
+
+def find_scripts(directory):
+    scripts = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__' and not d.startswith('.'))
+        scripts.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.py'))
+    return scripts
+
+
+def file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_report(path):
+    # Последняя запись по каждому скрипту из прошлого отчета
+    entries = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка прерванного прогона
+                    continue
+                entries[entry['path']] = entry
+    except OSError:
+        pass
+    return entries
+
+
+def plan(scripts, previous, runtime):
+    # (скрипты для запуска [(path, data, digest)], перенесенные записи)
+    pending = []
+    reused = []
+    for path in scripts:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = file_digest(data)
+        old = previous.get(path)
+        if old and old.get('sha256') == digest and old.get('runtime') == runtime:
+            reused.append(old)
+        else:
+            pending.append((path, data, digest))
+    return pending, reused
+
+
+class BatchRunner:
+    def __init__(self, jobs, timeout, limits, frames=None):
+        self.jobs = jobs
+        self.timeout = timeout
+        self.limits = limits
+        self.frames = frames
+        env = dict(os.environ)
+        env['SDL_VIDEODRIVER'] = 'dummy'
+        env['SDL_AUDIODRIVER'] = 'dummy'
+        self.pool = WorkerPool(size=jobs, env=env)
+        self.runtime = runtime_version()
+
+    def run_script(self, path, data, digest):
+        entry = {'path': path, 'sha256': digest, 'runtime': self.runtime}
+        try:
+            code = compile(data, path, 'exec', dont_inherit=True)
+        except (SyntaxError, ValueError) as e:
+            entry.update(status='syntax error', returncode=None, elapsed=0.0,
+                         stderr=f"{type(e).__name__}: {e}")
+            return entry
+
+        header = {'filename': path, 'cwd': os.path.dirname(path)}
+        if self.limits:
+            header['limits'] = self.limits
+        report_path = None
+        if self.frames:
+            fd, report_path = tempfile.mkstemp(prefix='batch-replay-', suffix='.json')
+            os.close(fd)
+            header['replay'] = {'recording': None, 'report': report_path, 'frames': self.frames}
+        try:
+            result = self.pool.run(code, timeout=self.timeout, header=header)
+        finally:
+            replay = None
+            if report_path:
+                replay = read_json(report_path)
+                discard_report(report_path)
+
+        entry.update(status=result.exit_reason, returncode=result.returncode,
+                     elapsed=round(result.elapsed, 4), stderr=result.stderr[-STDERR_TAIL:],
+                     stdout_chars=len(result.stdout), peak_rss=result.peak_rss,
+                     cpu_time=None if result.user_time is None else round(result.user_time + result.system_time, 4))
+        if result.error:
+            entry['stderr'] = result.error
+        if replay:
+            entry['frames'] = replay['stats']
+        return entry
+
+    def run(self, pending, report_path, reused=()):
+        # reused - записи прошлого отчета, переносимые без запуска
+        counts = {}
+        with open(report_path, 'w', encoding='utf-8') as report:
+            for entry in reused:
+                report.write(json.dumps(entry) + '\n')
+                counts[entry['status']] = counts.get(entry['status'], 0) + 1
+            report.flush()
+            if reused:
+                print(f"Reusing {len(reused)} unchanged result(s)")
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+                futures = [executor.submit(self.run_script, *job) for job in pending]
+                for done, future in enumerate(as_completed(futures), 1):
+                    entry = future.result()
+                    # Запись сразу попадает в отчет: прерванный прогон не теряет результаты
+                    report.write(json.dumps(entry) + '\n')
+                    report.flush()
+                    counts[entry['status']] = counts.get(entry['status'], 0) + 1
+                    print(f"[{done}/{len(pending)}] {entry['status']:<14} {entry['elapsed']:7.2f}s  {entry['path']}")
+            elapsed = time.perf_counter() - start
+
+        print(f"\nRan {len(pending)} script(s) in {elapsed:.1f}s with {self.jobs} job(s); "
+              + ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+        return counts
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a directory of game scripts headless across a worker pool")
+    parser.add_argument('directory')
+    parser.add_argument('--report', default='batch_report.jsonl', help="JSONL report, one line per script")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="parallel workers (default: CPU count)")
+    parser.add_argument('--timeout', type=float, default=10.0, help="seconds per script")
+    parser.add_argument('--frames', type=int, default=300,
+                        help="stop each game after this many frames; 0 runs until exit or timeout")
+    parser.add_argument('--cpu-seconds', type=int, default=20)
+    parser.add_argument('--memory-mb', type=int, default=2048)
+    parser.add_argument('--open-files', type=int, default=256)
+    parser.add_argument('--changed-only', action='store_true',
+                        help="re-run only scripts whose content or runtime changed since the last report")
+    args = parser.parse_args()
+
+    scripts = [os.path.abspath(path) for path in find_scripts(args.directory)]
+    if not scripts:
+        print(f"No scripts found in {args.directory}")
+        return 1
+    limits = {'cpu_seconds': args.cpu_seconds, 'memory_bytes': args.memory_mb * 1024 * 1024,
+              'open_files': args.open_files}
+    limits = {name: value for name, value in limits.items() if value}
+    previous = read_report(args.report) if args.changed_only else {}
+    pending, reused = plan(scripts, previous, runtime_version())
+
+    # Лишние воркеры не запускаем: их прогрев стоит импорта pygame
+    jobs = max(0, min(args.jobs, len(pending)))
+    runner = BatchRunner(jobs, args.timeout, limits, frames=args.frames or None)
+    try:
+        counts = runner.run(pending, args.report, reused)
+    finally:
+        runner.shutdown()
+    failed = sum(count for status, count in counts.items() if status != 'ok')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
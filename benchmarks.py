@@ -0,0 +1,240 @@
+# Бенчмарки редактора без дисплея (SDL dummy):
+#
+#     python benchmarks.py --output results.json
+#     python benchmarks.py --baseline results.json --tolerance 0.25
+#
+# С --baseline результаты сравниваются с сохраненным прогоном; если какая-то
+# метрика ухудшилась больше допуска, код возврата 1
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from utils import percentile
+
+SAMPLE_CODE = '''import pygame
+import random
+
+class Player(pygame.sprite.Sprite):
+    """Player sprite with "quoted" text and escapes\\n"""
+    def __init__(self, x, y, speed=5):
+        super().__init__()
+        self.rect = pygame.Rect(x, y, 30, 30)  # hitbox
+        self.speed = speed * 1.5
+        self.name = f"player_{x}_{y}"
+
+    def update(self, keys):
+        if keys[pygame.K_LEFT] and self.rect.left > 0:
+            self.rect.x -= self.speed
+        elif keys[pygame.K_RIGHT]:
+            self.rect.x += int(self.speed)
+        return [random.randint(0, 10) for _ in range(3)]
+'''
+
+RUN_CODE = 'print(sum(range(1000)))\n'
+
+
+def median(values):
+    return percentile(values, 0.5)
+
+
+def make_lines(count):
+    sample = SAMPLE_CODE.split('\n')
+    return [sample[i % len(sample)] for i in range(count)]
+
+
+class BenchmarkRunner:
+    def __init__(self, quick=False):
+        self.quick = quick
+        self.metrics = {}
+        pygame.init()
+        self.screen = pygame.display.set_mode((1200, 800))
+
+    def record(self, name, value, unit, higher_is_better=False):
+        self.metrics[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+        print(f"{name:<40} {value:12.3f} {unit}")
+
+    def make_editor(self, line_count):
+        from code_editor import CodeEditor
+        editor = CodeEditor(0, 50, 600, 700)
+        editor.lines = make_lines(line_count)
+        return editor
+
+    def run(self):
+        self.bench_tokenize()
+        for size in ((100, 10000) if self.quick else (100, 10000, 100000)):
+            self.bench_draw(size)
+        self.bench_edit(20000 if self.quick else 100000)
+        self.bench_execute()
+        return self.metrics
+
+    def bench_tokenize(self):
+        editor = self.make_editor(1)
+        lines = make_lines(2000)
+        # Лучший из повторов меньше зависит от шума планировщика
+        best = None
+        for _ in range(5 if self.quick else 20):
+            start = time.perf_counter()
+            for line in lines:
+                editor.tokenize_line(line)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.record('tokenize_line.lines_per_sec', len(lines) / best, 'lines/s', higher_is_better=True)
+        editor.shutdown()
+
+    def bench_draw(self, size):
+        editor = self.make_editor(size)
+        editor.scroll_offset = max(0, size // 2 - editor.visible_lines // 2)
+
+        # Первый кадр включает лексинг строк до области просмотра
+        start = time.perf_counter()
+        editor.draw(self.screen)
+        self.record(f'draw.{size}_lines.first_frame', (time.perf_counter() - start) * 1000, 'ms')
+
+        frames = 30 if self.quick else 120
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            editor.draw(self.screen)
+            times.append(time.perf_counter() - start)
+        self.record(f'draw.{size}_lines.frame_p50', median(times) * 1000, 'ms')
+
+        # Прокрутка на строку за кадр: в кадре появляется одна новая строка
+        times = []
+        for i in range(frames):
+            editor.scroll_offset = min(size - editor.visible_lines, editor.scroll_offset + 1)
+            start = time.perf_counter()
+            editor.draw(self.screen)
+            times.append(time.perf_counter() - start)
+        self.record(f'draw.{size}_lines.scroll_p95', percentile(times, 0.95) * 1000, 'ms')
+        editor.shutdown()
+
+    def bench_edit(self, size):
+        # Задержка нажатия: правка и перерисовка изменившегося редактора
+        editor = self.make_editor(size)
+        row = size // 2
+        editor.cursor_pos = [row, 0]
+        editor.adjust_scroll()
+        editor.draw(self.screen)
+        keystrokes = 50 if self.quick else 300
+
+        def measure(name, action):
+            times = []
+            for _ in range(keystrokes):
+                start = time.perf_counter()
+                action()
+                editor.draw_dirty(self.screen)
+                times.append(time.perf_counter() - start)
+            self.record(f'edit.{size}_lines.{name}_p50', median(times) * 1000, 'ms')
+            self.record(f'edit.{size}_lines.{name}_p95', percentile(times, 0.95) * 1000, 'ms')
+
+        measure('insert_text', lambda: editor.insert_text('x'))
+        measure('backspace', editor.backspace)
+        measure('insert_newline', editor.insert_newline)
+        editor.shutdown()
+
+    def bench_execute(self):
+        # Время от execute_code до готового вывода; кэш результатов не используется
+        from game_preview import GamePreview
+        preview = GamePreview(600, 50, 600, 700)
+        runs = 3 if self.quick else 10
+        times = []
+        try:
+            for i in range(runs):
+                # Пул успевает запустить замену занятому воркеру, как между
+                # запусками в редакторе
+                if i:
+                    time.sleep(1.0)
+                start = time.perf_counter()
+                preview.execute_code(RUN_CODE, bypass_cache=True)
+                while preview.is_running():
+                    preview.update(0.001)
+                    time.sleep(0.0005)
+                times.append(time.perf_counter() - start)
+                if preview.output.has_errors:
+                    raise RuntimeError(preview.output.text('stderr'))
+        finally:
+            preview.shutdown()
+        self.record('execute_code.first_ms', times[0] * 1000, 'ms')
+        self.record('execute_code.round_trip_p50', median(times[1:] or times) * 1000, 'ms')
+
+
+def compare(metrics, baseline, tolerance):
+    # Возвращает списки регрессий (метрика хуже базовой больше чем на tolerance)
+    # и метрик базового прогона, которых нет в текущем
+    regressions = []
+    missing = []
+    print()
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, base in baseline.items():
+        current = metrics.get(name)
+        if current is None:
+            print(f"{name:<40} {base['value']:12.3f} {'missing':>12}")
+            missing.append(name)
+            continue
+        if not base['value']:
+            continue
+        ratio = current['value'] / base['value']
+        if base.get('higher_is_better'):
+            worse = ratio < 1 / (1 + tolerance)
+        else:
+            worse = ratio > 1 + tolerance
+        mark = '  REGRESSION' if worse else ''
+        print(f"{name:<40} {base['value']:12.3f} {current['value']:12.3f} {(ratio - 1) * 100:+7.1f}%{mark}")
+        if worse:
+            regressions.append(name)
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless editor benchmarks")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against results stored by --output")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes and fewer iterations")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # Быстрый и полный прогоны меряют разные размеры: сравнивать их нельзя
+        if baseline.get('quick', False) != args.quick:
+            mode = "with --quick" if baseline.get('quick') else "without --quick"
+            parser.error(f"baseline {args.baseline} was recorded {mode}; run the benchmarks the same way")
+
+    metrics = BenchmarkRunner(quick=args.quick).run()
+    results = {
+        'python': sys.version.split()[0],
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'metrics': metrics,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions, missing = compare(metrics, baseline['metrics'], args.tolerance)
+        if missing:
+            # Метрика могла пропасть из-за сломанного замера: такое сравнение неполное
+            print(f"\n{len(missing)} baseline metric(s) missing from this run: {', '.join(missing)}")
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        if regressions or missing:
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
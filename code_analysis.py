@@ -0,0 +1,218 @@
+import ast
+import builtins
+import threading
+
+MODULE_NAMES = {'__name__', '__file__', '__doc__', '__builtins__', '__spec__', '__loader__'}
+CONTINUATION_KEYWORDS = ('else', 'elif', 'except', 'finally')
+MAX_MERGED_BLOCKS = 20
+
+
+class BlockAnalysis:
+    # Результат разбора одного блока верхнего уровня; строки считаются от начала блока
+    def __init__(self):
+        self.defined = set()
+        self.used = []
+        self.imports = []
+        self.star_import = False
+        self.error = None
+
+
+class NameCollector(ast.NodeVisitor):
+    def __init__(self, result):
+        self.result = result
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.result.used.append((node.id, node.lineno - 1, node.col_offset, node.end_col_offset))
+        else:
+            self.result.defined.add(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.result.defined.add(node.name)
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self.result.defined.add(arg.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self.result.defined.add(arg.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.result.defined.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            name = alias.asname or alias.name.split('.')[0]
+            self.add_import(name, alias, node)
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.result.star_import = True
+            else:
+                self.add_import(alias.asname or alias.name, alias, node)
+
+    def add_import(self, name, alias, node):
+        self.result.defined.add(name)
+        source = alias if hasattr(alias, 'lineno') else node
+        self.result.imports.append((name, source.lineno - 1, source.col_offset, source.end_col_offset))
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.result.defined.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.result.defined.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self.result.defined.add(node.name)
+        self.generic_visit(node)
+
+
+def split_blocks(lines):
+    # Новый блок начинается со строки без отступа, если она не продолжает
+    # предыдущую конструкцию (else/except, закрывающая скобка, декоратор)
+    blocks = []
+    start = 0
+    previous = ""
+    for i, line in enumerate(lines):
+        if (i > start and line and not line[0].isspace()
+                and not line.startswith(('#', ')', ']', '}'))
+                and line.split(None, 1)[0].rstrip(':') not in CONTINUATION_KEYWORDS
+                and not previous.startswith('@') and not previous.endswith('\\')):
+            blocks.append((start, lines[start:i]))
+            start = i
+        if line.strip():
+            previous = line
+    blocks.append((start, lines[start:]))
+    return blocks
+
+
+def analyze_block(text):
+    result = BlockAnalysis()
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as e:
+        result.error = ((e.lineno or 1) - 1, max(0, (e.offset or 1) - 1), e.msg)
+        return result
+    NameCollector(result).visit(tree)
+    return result
+
+
+class AnalysisService:
+    # Фоновый анализ: UI передает снимки буфера, поток разбирает только
+    # изменившиеся блоки верхнего уровня и публикует диагностику
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.results = None
+        self.block_cache = {}
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, text)
+            self.condition.notify()
+
+    def poll(self):
+        # Возвращает новую диагностику, если она появилась с прошлого вызова
+        with self.condition:
+            results, self.results = self.results, None
+        return results
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation, text = self.pending
+                self.pending = None
+
+            diagnostics = self.analyze(text, lambda: self.generation != generation)
+            if diagnostics is None:
+                continue
+            with self.condition:
+                if generation == self.generation:
+                    self.results = diagnostics
+
+    def analyze(self, text, cancelled):
+        blocks = split_blocks(text.split('\n'))
+        analyses = []
+        cache = {}
+        i = 0
+        while i < len(blocks):
+            if cancelled():
+                return None
+            start, block_lines = blocks[i]
+            block_text = '\n'.join(block_lines)
+            result = self.parse_block(block_text)
+            cache[block_text] = result
+            # Блок мог быть разрезан внутри многострочной конструкции (скобки,
+            # строки в тройных кавычках): пробуем склеить его со следующими
+            if result.error and result.error[0] >= len(block_lines) - 1:
+                merged = block_lines
+                for j in range(i + 1, min(len(blocks), i + 1 + MAX_MERGED_BLOCKS)):
+                    merged = merged + blocks[j][1]
+                    merged_text = '\n'.join(merged)
+                    merged_result = self.parse_block(merged_text)
+                    if not merged_result.error:
+                        cache[merged_text] = result = merged_result
+                        i = j
+                        break
+            analyses.append((start, result))
+            i += 1
+        self.block_cache = cache
+
+        defined = set(dir(builtins)) | MODULE_NAMES
+        used = set()
+        star_import = False
+        for _, result in analyses:
+            defined |= result.defined
+            used.update(name for name, _, _, _ in result.used)
+            star_import = star_import or result.star_import
+
+        diagnostics = {}
+        for start, result in analyses:
+            if result.error:
+                row, col, message = result.error
+                self.add(diagnostics, start + row, col, col + 1, 'error', message)
+            if not star_import:
+                for name, row, col, end_col in result.used:
+                    if name not in defined:
+                        self.add(diagnostics, start + row, col, end_col, 'error', f"undefined name '{name}'")
+            for name, row, col, end_col in result.imports:
+                if name not in used:
+                    self.add(diagnostics, start + row, col, end_col, 'warning', f"'{name}' imported but unused")
+        return diagnostics
+
+    def parse_block(self, text):
+        result = self.block_cache.get(text)
+        if result is None:
+            result = analyze_block(text)
+        return result
+
+    def add(self, diagnostics, row, col, end_col, kind, message):
+        diagnostics.setdefault(row, []).append((col, end_col, kind, message))
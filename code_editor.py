@@ -1,19 +1,43 @@
+import re
+import time
 import pygame
+from bisect import bisect_right
 from pygame.locals import *
+from glyph_cache import GlyphCache, GlyphMetrics, SurfaceCache
+from syntax_lexer import IncrementalLexer
+from text_buffer import TextBuffer
+from file_loader import MappedFile
+from edit_history import EditHistory
+from search import SearchIndex, FindBar
+from code_analysis import AnalysisService
+from frame_profiler import PROFILER
+from font_registry import FONTS
+
+# Длинные токены режутся на куски, чтобы рисовать только видимую часть строки
+MAX_SPAN_CHARS = 64
+# Строки шире этого значения не кэшируются целиком, а рисуются по видимым кускам
+MAX_LINE_SURFACE_WIDTH = 2048
 
 class CodeEditor:
     def __init__(self, x, y, width, height):
         self.rect = pygame.Rect(x, y, width, height)
-        self.lines = [""]
+        self.text_rect = pygame.Rect(x + 45, y, width - 45, height)
         self.cursor_pos = [0, 0]  # [line, column]
         self.scroll_offset = 0
-        self.font = pygame.font.SysFont("consolas", 16)
+        self.scroll_x = 0  # горизонтальная прокрутка в пикселях
+        self.font = FONTS.get("consolas", 16)
         self.line_height = 20
         self.visible_lines = height // self.line_height
         self.selection_start = None
+        self.error_line = None
         self.cursor_blink = True
         self.blink_timer = 0
         
+        # Состояние частичной перерисовки
+        self.dirty = True
+        self.cursor_dirty = False
+        self.cursor_rect = None
+        
         # Python keywords for syntax highlighting
         self.keywords = {
             'def', 'class', 'if', 'else', 'elif', 'for', 'while', 'import',
@@ -24,115 +48,274 @@ class CodeEditor:
         
         self.types = {'int', 'float', 'str', 'bool', 'list', 'dict', 'tuple'}
         
+        # Инкрементальный лексер хранит токены и состояние конца каждой строки
+        self.lexer = IncrementalLexer(self.keywords, self.types)
+        # Лексирование до области просмотра ограничено по времени на кадр;
+        # пока лексер не догнал, строки рисуются с предварительным состоянием
+        self.lex_budget = 0.004
+        self.lex_ready = True
+        self.view_start = 0
+        self.view_states = []
+        # Получает все правки буфера (журнал автосохранения)
+        self.edit_listener = None
+        # Растет при каждом изменении текста (живая сессия сравнивает версии)
+        self.text_version = 0
+        self.history = EditHistory()
+        self.search = SearchIndex()
+        self.find_bar = FindBar(self)
+        self.current_match = None
+        self.find_pending = False
+        self.match_color = (70, 70, 40)
+        self.current_match_color = (130, 110, 30)
+        self.lines = [""]
+        
+        self.token_colors = {
+            'keyword': (86, 156, 214),   # Синий
+            'string': (206, 145, 120),   # Оранжевый
+            'comment': (87, 166, 74),    # Зеленый
+            'number': (181, 206, 168),   # Светло-зеленый
+            'type': (78, 201, 176),      # Бирюзовый
+        }
+        self.default_color = (220, 220, 220)
+        
+        # Фоновый анализ кода: снимок буфера отправляется после паузы в наборе
+        self.analyzer = AnalysisService()
+        self.analysis_delay = 0.4
+        self.analysis_timer = 0
+        self.analysis_pending = True
+        self.analysis_max_lines = 20000
+        self.diagnostics = {}
+        self.diagnostic_colors = {'error': (240, 80, 80), 'warning': (220, 190, 80)}
+        
+        # Тепловая карта Profile Run в колонке номеров: строка -> доля от самой горячей
+        self.line_heat = {}
+        self.gutter_color = (40, 40, 50)
+        self.heat_color = (200, 70, 40)
+        
+        # Кэш отрисованных токенов (текст, цвет) и целых строк
+        self.glyph_cache = GlyphCache(self.font, max_size=2048)
+        self.metrics = GlyphMetrics(self.font)
+        self.line_cache = SurfaceCache(max_size=256)
+        self.span_cache = SurfaceCache(max_size=512)
+        
+    @property
+    def lines(self):
+        return self._lines
+    
+    @lines.setter
+    def lines(self, lines):
+        # Принимает список строк или готовый TextBuffer
+        if not isinstance(lines, TextBuffer):
+            lines = TextBuffer(lines)
+        # Отображение файла старого буфера закрывается. Отображенный буфер
+        # заменяется только через AutoSaver.open, который сначала дожидается
+        # фоновой записи его снимка
+        previous = getattr(self, '_lines', None)
+        self._lines = lines
+        if previous is not None and previous is not lines:
+            previous.close()
+        self.error_line = None
+        self.lexer.reset(len(lines))
+        self.diagnostics = {}
+        self.line_heat = {}
+        self.schedule_analysis()
+        # Новый документ: отменять в нем нечего
+        self.history.clear()
+        self.search_changed()
+        if self.edit_listener:
+            self.edit_listener.record_lines(lines)
+        self.dirty = True
+    
+    def load_file(self, path):
+        # Файл отображается в память: открытие не зависит от его размера,
+        # строки декодируются, когда до них доходит область просмотра
+        self.lines = TextBuffer.from_mapped(MappedFile(path))
+        self.cursor_pos = [0, 0]
+        self.scroll_offset = 0
+        self.scroll_x = 0
+    
+    def mark_dirty(self):
+        self.dirty = True
+    
+    def draw_dirty(self, screen):
+        if self.dirty:
+            self.draw(screen)
+            return [self.rect]
+        if self.cursor_dirty:
+            return self.draw_cursor_region(screen)
+        return []
+    
     def draw(self, screen):
         # Фон редактора
         pygame.draw.rect(screen, (25, 25, 35), self.rect)
         
         # Номера строк
         line_number_rect = pygame.Rect(self.rect.left, self.rect.top, 40, self.rect.height)
-        pygame.draw.rect(screen, (40, 40, 50), line_number_rect)
+        pygame.draw.rect(screen, self.gutter_color, line_number_rect)
         
         # Видимые строки
         start_line = self.scroll_offset
         end_line = min(start_line + self.visible_lines, len(self.lines))
         
+        with PROFILER.section('tokenize'):
+            self.lex_ready = self.lexer.catch_up(end_line - 1, self.lines, time.perf_counter() + self.lex_budget)
+            self.view_start = start_line
+            self.view_states = self.lexer.view_states(start_line, end_line, self.lines)
+        
+        text_x = self.text_rect.left - self.scroll_x
         for i in range(start_line, end_line):
             y_pos = self.rect.top + (i - start_line) * self.line_height
             
-            # Номер строки
-            line_num_text = self.font.render(str(i + 1), True, (128, 128, 128))
+            # Номер строки (строка с синтаксической ошибкой подсвечивается)
+            if i == self.error_line:
+                pygame.draw.rect(screen, (120, 40, 40), (self.rect.left, y_pos, 40, self.line_height))
+            elif i in self.line_heat:
+                pygame.draw.rect(screen, self.heat_gradient(self.line_heat[i]), (self.rect.left, y_pos, 40, self.line_height))
+            line_num_text = self.glyph_cache.render(str(i + 1), (128, 128, 128))
             screen.blit(line_num_text, (self.rect.left + 5, y_pos))
             
-            # Текст строки с подсветкой синтаксиса
-            text_x = self.rect.left + 45
-            self.draw_syntax_highlighted_line(screen, self.lines[i], text_x, y_pos)
+            # Текст строки с подсветкой синтаксиса (только видимые столбцы)
+            screen.set_clip(self.text_rect)
+            self.draw_matches(screen, i, text_x, y_pos)
+            self.draw_syntax_highlighted_line(screen, i, text_x, y_pos)
+            self.draw_diagnostics(screen, i, text_x, y_pos)
+            screen.set_clip(None)
         
         # Курсор
+        self.cursor_rect = self.get_cursor_rect()
         if self.cursor_blink:
-            cursor_x = self.rect.left + 45 + self.font.size(self.lines[self.cursor_pos[0]][:self.cursor_pos[1]])[0]
-            cursor_y = self.rect.top + (self.cursor_pos[0] - self.scroll_offset) * self.line_height
-            pygame.draw.line(screen, (255, 255, 255), (cursor_x, cursor_y), 
-                           (cursor_x, cursor_y + self.line_height), 2)
-    
-    def draw_syntax_highlighted_line(self, screen, line, x, y):
-        tokens = self.tokenize_line(line)
-        current_x = x
+            self.draw_cursor(screen)
         
-        for token_type, token_text in tokens:
-            if token_type == 'keyword':
-                color = (86, 156, 214)  # Синий
-            elif token_type == 'string':
-                color = (206, 145, 120)  # Оранжевый
-            elif token_type == 'comment':
-                color = (87, 166, 74)   # Зеленый
-            elif token_type == 'number':
-                color = (181, 206, 168) # Светло-зеленый
-            elif token_type == 'type':
-                color = (78, 201, 176)  # Бирюзовый
-            else:
-                color = (220, 220, 220)
-            
-            token_surface = self.font.render(token_text, True, color)
-            screen.blit(token_surface, (current_x, y))
-            current_x += self.font.size(token_text)[0]
+        if self.find_bar.active:
+            self.find_bar.draw(screen)
+        
+        self.dirty = False
+        self.cursor_dirty = False
     
-    def tokenize_line(self, line):
-        tokens = []
-        i = 0
-        n = len(line)
+    def get_cursor_rect(self):
+        cursor_x = self.text_rect.left - self.scroll_x + self.metrics.col_to_x(self.lines[self.cursor_pos[0]], self.cursor_pos[1])
+        cursor_y = self.rect.top + (self.cursor_pos[0] - self.scroll_offset) * self.line_height
+        return pygame.Rect(cursor_x, cursor_y, 2, self.line_height).clip(self.text_rect)
+    
+    def draw_cursor(self, screen):
+        if self.cursor_rect:
+            pygame.draw.rect(screen, (255, 255, 255), self.cursor_rect)
+    
+    def draw_cursor_region(self, screen):
+        # Мигание курсора перерисовывает только прямоугольник 2x20 под ним
+        self.cursor_dirty = False
+        if not self.cursor_rect:
+            return []
+        if self.find_bar.active and self.cursor_rect.colliderect(self.find_bar.get_rect()):
+            return []
+        
+        screen.set_clip(self.cursor_rect.clip(self.text_rect))
+        pygame.draw.rect(screen, (25, 25, 35), self.cursor_rect)
+        line_idx = self.cursor_pos[0]
+        y_pos = self.rect.top + (line_idx - self.scroll_offset) * self.line_height
+        self.draw_matches(screen, line_idx, self.text_rect.left - self.scroll_x, y_pos)
+        self.draw_syntax_highlighted_line(screen, line_idx, self.text_rect.left - self.scroll_x, y_pos)
+        self.draw_diagnostics(screen, line_idx, self.text_rect.left - self.scroll_x, y_pos)
+        if self.cursor_blink:
+            self.draw_cursor(screen)
+        screen.set_clip(None)
+        return [self.cursor_rect]
+    
+    def draw_syntax_highlighted_line(self, screen, row, x, y):
+        line = self.lines[row]
+        if not line:
+            return
+        # Токены берутся из кэша лексера; строка перерисовывается только
+        # после изменения её текста или состояния на входе
+        state = self.line_state(row)
+        key = (line, state)
+        starts, spans, width = self.span_cache.get(key, lambda: self.build_spans(row, state))
+        
+        if width <= MAX_LINE_SURFACE_WIDTH:
+            line_surface = self.line_cache.get(key, lambda: self.render_line(spans, width))
+            screen.blit(line_surface, (x, y))
+            return
         
-        while i < n:
-            # Комментарии
-            if line[i] == '#':
-                tokens.append(('comment', line[i:]))
+        # Длинная строка: рисуем только куски, попадающие в видимое окно
+        view_left = self.text_rect.left - x
+        view_right = view_left + self.text_rect.width
+        first = max(0, bisect_right(starts, view_left) - 1)
+        for span_x, span_text, color in spans[first:]:
+            if span_x >= view_right:
                 break
-            
-            # Строки
-            elif line[i] in ('"', "'"):
-                quote = line[i]
-                j = i + 1
-                while j < n and line[j] != quote:
-                    j += 1
-                if j < n:
-                    j += 1
-                tokens.append(('string', line[i:j]))
-                i = j
-                continue
-            
-            # Числа
-            elif line[i].isdigit():
-                j = i
-                while j < n and (line[j].isdigit() or line[j] == '.'):
-                    j += 1
-                tokens.append(('number', line[i:j]))
-                i = j
-                continue
-            
-            # Идентификаторы и ключевые слова
-            elif line[i].isalpha() or line[i] == '_':
-                j = i
-                while j < n and (line[j].isalnum() or line[j] == '_'):
-                    j += 1
-                word = line[i:j]
-                if word in self.keywords:
-                    tokens.append(('keyword', word))
-                elif word in self.types:
-                    tokens.append(('type', word))
-                else:
-                    tokens.append(('normal', word))
-                i = j
-                continue
-            
-            # Прочие символы
-            else:
-                tokens.append(('normal', line[i]))
-                i += 1
+            screen.blit(self.glyph_cache.render(span_text, color), (x + span_x, y))
+    
+    def line_state(self, row):
+        # Состояние лексера на входе строки, посчитанное при последней отрисовке
+        i = row - self.view_start
+        if 0 <= i < len(self.view_states):
+            return self.view_states[i]
+        return self.lexer.start_states[row] if self.lexer.is_exact(row) else None
+    
+    def build_spans(self, row, state):
+        # Смещения кусков строки считаются один раз и кэшируются вместе с текстом
+        line = self.lines[row]
+        with PROFILER.section('tokenize'):
+            tokens = self.lexer.tokens_for(row, self.lines, state)
+        spans = []
+        col = 0
+        for token_type, token_text in tokens:
+            color = self.token_colors.get(token_type, self.default_color)
+            for i in range(0, len(token_text), MAX_SPAN_CHARS):
+                span_text = token_text[i:i + MAX_SPAN_CHARS]
+                spans.append((self.metrics.col_to_x(line, col), span_text, color))
+                col += len(span_text)
+        starts = [span[0] for span in spans]
+        return starts, spans, self.metrics.col_to_x(line, col)
+    
+    def draw_matches(self, screen, row, x, y):
+        # Подсветка совпадений поиска под текстом строки
+        line = self.lines[row]
+        for start, end in self.search.matches(line):
+            start_x = x + self.metrics.col_to_x(line, start)
+            end_x = x + self.metrics.col_to_x(line, end)
+            current = self.current_match == (row, start, end)
+            color = self.current_match_color if current else self.match_color
+            pygame.draw.rect(screen, color, (start_x, y, max(end_x - start_x, 2), self.line_height))
+    
+    def draw_diagnostics(self, screen, row, x, y):
+        # Подчеркивание ошибок и предупреждений анализатора
+        line = self.lines[row]
+        underline_y = y + self.line_height - 3
+        for col, end_col, kind, message in self.diagnostics.get(row, ()):
+            start_x = x + self.metrics.col_to_x(line, col)
+            end_x = x + self.metrics.col_to_x(line, max(end_col, col + 1))
+            color = self.diagnostic_colors.get(kind, self.default_color)
+            pygame.draw.line(screen, color, (start_x, underline_y), (max(end_x, start_x + 4), underline_y), 2)
+    
+    def render_line(self, spans, width):
+        with PROFILER.section('line.render'):
+            return self.compose_line(spans, width)
+    
+    def compose_line(self, spans, width):
+        token_surfaces = []
+        for span_x, span_text, color in spans:
+            token_surface = self.glyph_cache.render(span_text, color)
+            token_surfaces.append((token_surface, span_x))
+            width = max(width, span_x + token_surface.get_width())
         
-        return tokens
+        line_surface = pygame.Surface((max(width, 1), self.font.get_height()), pygame.SRCALPHA)
+        for token_surface, token_x in token_surfaces:
+            # BLEND_RGBA_MAX сохраняет альфа-канал сглаженных глифов без затемнения
+            line_surface.blit(token_surface, (token_x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        return line_surface
+    
+    def tokenize_line(self, line):
+        return self.lexer.lex_line(line)[0]
     
     def handle_event(self, event):
         if event.type == KEYDOWN:
-            if event.key == K_RETURN:
+            if self.find_bar.active and self.find_bar.handle_key(event):
+                self.dirty = True
+                return
+            if event.mod & KMOD_CTRL:
+                self.handle_shortcut(event)
+            elif event.key == K_RETURN:
                 self.insert_newline()
             elif event.key == K_BACKSPACE:
                 self.backspace()
@@ -150,8 +333,10 @@ class CodeEditor:
                 self.move_cursor_right()
             elif event.key == K_HOME:
                 self.cursor_pos[1] = 0
+                self.adjust_scroll()
             elif event.key == K_END:
                 self.cursor_pos[1] = len(self.lines[self.cursor_pos[0]])
+                self.adjust_scroll()
             elif event.key == K_PAGEUP:
                 self.scroll_offset = max(0, self.scroll_offset - self.visible_lines)
                 self.cursor_pos[0] = max(0, self.cursor_pos[0] - self.visible_lines)
@@ -166,47 +351,192 @@ class CodeEditor:
             
             self.cursor_blink = True
             self.blink_timer = 0
+            self.dirty = True
             
-        elif event.type == MOUSEBUTTONDOWN:
+        elif event.type == MOUSEBUTTONDOWN and event.button == 1:
             if self.rect.collidepoint(event.pos):
                 self.handle_click(event.pos)
+                self.dirty = True
+        
+        elif event.type == MOUSEWHEEL:
+            if self.rect.collidepoint(pygame.mouse.get_pos()):
+                self.handle_wheel(event)
+    
+    def handle_shortcut(self, event):
+        if event.key == K_z and event.mod & KMOD_SHIFT or event.key == K_y:
+            self.redo()
+        elif event.key == K_z:
+            self.undo()
+        elif event.key in (K_f, K_h):
+            self.find_bar.open(replace=event.key == K_h)
+        elif event.unicode and event.unicode.isprintable():
+            # AltGr в Windows приходит как Ctrl+Alt
+            self.insert_text(event.unicode)
+    
+    def undo(self):
+        if self.history.undo(self):
+            self.adjust_scroll()
+    
+    def redo(self):
+        if self.history.redo(self):
+            self.adjust_scroll()
+    
+    def search_changed(self):
+        # Правка сдвигает номера строк: сводка поиска пересчитывается,
+        # совпадения в неизмененных строках берутся из кэша
+        self.search.invalidate()
+        self.current_match = None
+    
+    def find_next(self, backwards=False, from_cursor=False):
+        row, col = self.cursor_pos
+        strict = False
+        current = self.current_match
+        if current and self.cursor_pos == [current[0], current[2]]:
+            # Курсор стоит в конце текущего совпадения
+            if from_cursor or backwards:
+                col = current[1]
+            else:
+                strict = current[1] == current[2]
+        # При наборе запроса не просматриваем весь файл за один кадр:
+        # если совпадение не нашлось рядом, переход выполнится после подсчета
+        limit = 2000 if from_cursor else None
+        match = self.search.find(self.lines, row, col, backwards, strict, limit)
+        self.find_pending = match is None and from_cursor and not self.search.complete
+        self.current_match = match
+        if match:
+            self.cursor_pos = [match[0], match[2]]
+            self.adjust_scroll()
+        self.dirty = True
+    
+    def replace_all(self, replacement):
+        try:
+            changes, count = self.search.replace_all(self.lines, replacement)
+        except re.error as e:
+            self.find_bar.message = f"Error: {e}"
+            return
+        if changes:
+            self.replace_lines(changes)
+        self.find_bar.message = f"Replaced {count}"
+    
+    def clear(self):
+        # Очистка - обычное удаление всего текста, ее можно отменить
+        last = len(self.lines) - 1
+        self.delete_range(0, 0, last, len(self.lines[last]))
+        self.cursor_pos = [0, 0]
+        self.scroll_offset = 0
+        self.scroll_x = 0
+    
+    def set_line_heat(self, profile):
+        # Сэмплы по строкам из отчета профилировщика (номера строк с единицы)
+        self.line_heat = {}
+        if profile and profile['lines']:
+            hottest = max(profile['lines'].values())
+            self.line_heat = {lineno - 1: count / hottest for lineno, count in profile['lines'].items()}
+        self.dirty = True
+    
+    def heat_gradient(self, heat):
+        # Корень растягивает низ шкалы: слабо нагруженные строки тоже заметны
+        heat = heat ** 0.5
+        return tuple(int(cold + (hot - cold) * heat) for cold, hot in zip(self.gutter_color, self.heat_color))
+    
+    def show_error(self, line, col):
+        # Переводим курсор на место синтаксической ошибки
+        self.error_line = min(line, len(self.lines) - 1)
+        self.cursor_pos = [self.error_line, min(col, len(self.lines[self.error_line]))]
+        self.adjust_scroll()
+        self.dirty = True
+    
+    def schedule_analysis(self):
+        # Вызывается всеми путями изменения текста
+        self.text_version += 1
+        self.analysis_pending = True
+        self.analysis_timer = 0
+    
+    def replace_lines(self, changes):
+        # Пакетная замена строк {row: text} - одна операция буфера и один шаг отмены
+        self.error_line = None
+        self.schedule_analysis()
+        old = self.lines.replace_lines(changes)
+        self.history.record_replace(old, changes)
+        if self.edit_listener:
+            self.edit_listener.record_replace(changes)
+        for row in changes:
+            self.lexer.invalidate(row)
+        self.search_changed()
+        self.dirty = True
+    
+    def insert_at(self, row, col, text):
+        # Все вставки проходят через буфер и инвалидируют кэш лексера
+        self.error_line = None
+        self.schedule_analysis()
+        end_row, end_col = self.lines.insert_text(row, col, text)
+        self.history.record_insert(row, col, text)
+        if self.edit_listener:
+            self.edit_listener.record_insert(row, col, text)
+        self.lexer.invalidate(row)
+        if end_row > row:
+            self.lexer.insert_lines(row + 1, end_row - row)
+            self.line_heat = {}
+            self.shift_diagnostics(row, end_row - row)
+        self.search_changed()
+        self.dirty = True
+        return end_row, end_col
+    
+    def delete_range(self, row, col, end_row, end_col):
+        self.error_line = None
+        self.schedule_analysis()
+        removed = self.lines.delete_text(row, col, end_row, end_col)
+        self.history.record_delete(row, col, removed)
+        if self.edit_listener:
+            self.edit_listener.record_delete(row, col, end_row, end_col)
+        if end_row > row:
+            self.lexer.delete_lines(row + 1, end_row - row)
+            self.line_heat = {}
+            self.shift_diagnostics(row, row - end_row)
+        self.lexer.invalidate(row)
+        self.search_changed()
+        self.dirty = True
+        return removed
+    
+    def shift_diagnostics(self, row, delta):
+        # До следующего анализа диагностика строк ниже row едет вместе с ними,
+        # а у удаленных строк пропадает
+        shifted = {}
+        for line, items in self.diagnostics.items():
+            if line <= row:
+                shifted[line] = items
+            elif line + delta > row:
+                shifted[line + delta] = items
+        self.diagnostics = shifted
     
     def insert_text(self, text):
-        line = self.lines[self.cursor_pos[0]]
-        self.lines[self.cursor_pos[0]] = line[:self.cursor_pos[1]] + text + line[self.cursor_pos[1]:]
-        self.cursor_pos[1] += len(text)
+        self.cursor_pos = list(self.insert_at(self.cursor_pos[0], self.cursor_pos[1], text))
         self.adjust_scroll()
     
     def insert_newline(self):
         current_line = self.lines[self.cursor_pos[0]]
         indent = len(current_line) - len(current_line.lstrip())
         
-        self.lines[self.cursor_pos[0]] = current_line[:self.cursor_pos[1]]
-        self.lines.insert(self.cursor_pos[0] + 1, " " * indent + current_line[self.cursor_pos[1]:])
-        
-        self.cursor_pos[0] += 1
-        self.cursor_pos[1] = indent
+        self.cursor_pos = list(self.insert_at(self.cursor_pos[0], self.cursor_pos[1], "\n" + " " * indent))
         self.adjust_scroll()
     
     def backspace(self):
-        if self.cursor_pos[1] > 0:
-            line = self.lines[self.cursor_pos[0]]
-            self.lines[self.cursor_pos[0]] = line[:self.cursor_pos[1]-1] + line[self.cursor_pos[1]:]
+        row, col = self.cursor_pos
+        if col > 0:
+            self.delete_range(row, col - 1, row, col)
             self.cursor_pos[1] -= 1
-        elif self.cursor_pos[0] > 0:
-            current_line = self.lines.pop(self.cursor_pos[0])
-            self.cursor_pos[0] -= 1
-            self.cursor_pos[1] = len(self.lines[self.cursor_pos[0]])
-            self.lines[self.cursor_pos[0]] += current_line
+        elif row > 0:
+            prev_len = len(self.lines[row - 1])
+            self.delete_range(row - 1, prev_len, row, 0)
+            self.cursor_pos = [row - 1, prev_len]
         self.adjust_scroll()
     
     def delete(self):
-        line = self.lines[self.cursor_pos[0]]
-        if self.cursor_pos[1] < len(line):
-            self.lines[self.cursor_pos[0]] = line[:self.cursor_pos[1]] + line[self.cursor_pos[1]+1:]
-        elif self.cursor_pos[0] < len(self.lines) - 1:
-            next_line = self.lines.pop(self.cursor_pos[0] + 1)
-            self.lines[self.cursor_pos[0]] += next_line
+        row, col = self.cursor_pos
+        if col < len(self.lines[row]):
+            self.delete_range(row, col, row, col + 1)
+        elif row < len(self.lines) - 1:
+            self.delete_range(row, col, row + 1, 0)
         self.adjust_scroll()
     
     def move_cursor_up(self):
@@ -239,38 +569,91 @@ class CodeEditor:
         self.adjust_scroll()
     
     def handle_click(self, pos):
-        rel_x = pos[0] - (self.rect.left + 45)
+        rel_x = pos[0] - self.text_rect.left + self.scroll_x
         rel_y = pos[1] - self.rect.top
         
         line_idx = self.scroll_offset + rel_y // self.line_height
         if 0 <= line_idx < len(self.lines):
             self.cursor_pos[0] = line_idx
             
-            line = self.lines[line_idx]
-            width = 0
-            col = 0
-            for i, char in enumerate(line):
-                char_width = self.font.size(char)[0]
-                if width + char_width / 2 > rel_x:
-                    break
-                width += char_width
-                col = i + 1
-            self.cursor_pos[1] = col
+            self.cursor_pos[1] = self.metrics.x_to_col(self.lines[line_idx], rel_x)
         
         self.cursor_blink = True
         self.blink_timer = 0
     
+    def handle_wheel(self, event):
+        # Колесо прокручивает строки, Shift + колесо или тачпад - по горизонтали
+        dx, dy = event.x, event.y
+        if pygame.key.get_mods() & KMOD_SHIFT:
+            dx, dy = dy, 0
+        if dy:
+            max_offset = max(0, len(self.lines) - self.visible_lines)
+            self.scroll_offset = max(0, min(max_offset, self.scroll_offset - dy * 3))
+        if dx:
+            self.scroll_x = int(max(0, min(self.max_scroll_x(), self.scroll_x - dx * self.metrics.char_width * 4)))
+        self.dirty = True
+    
+    def max_scroll_x(self):
+        # Ширина самой длинной видимой строки
+        end_line = min(self.scroll_offset + self.visible_lines, len(self.lines))
+        widest = max((self.metrics.text_width(self.lines[i]) for i in range(self.scroll_offset, end_line)), default=0)
+        return max(0, widest - self.text_rect.width + int(self.metrics.char_width * 2))
+    
     def adjust_scroll(self):
         if self.cursor_pos[0] < self.scroll_offset:
             self.scroll_offset = self.cursor_pos[0]
         elif self.cursor_pos[0] >= self.scroll_offset + self.visible_lines:
             self.scroll_offset = self.cursor_pos[0] - self.visible_lines + 1
+        
+        # Курсор всегда остается в видимом окне по горизонтали
+        cursor_x = self.metrics.col_to_x(self.lines[self.cursor_pos[0]], self.cursor_pos[1])
+        margin = int(self.metrics.char_width * 4)
+        if cursor_x < self.scroll_x:
+            self.scroll_x = max(0, cursor_x - margin)
+        elif cursor_x > self.scroll_x + self.text_rect.width - 2:
+            self.scroll_x = cursor_x - self.text_rect.width + margin
     
     def update(self, dt):
         self.blink_timer += dt
         if self.blink_timer >= 0.5:
             self.cursor_blink = not self.cursor_blink
             self.blink_timer = 0
+            self.cursor_dirty = True
+        
+        # Снимок отправляется в анализатор, когда набор текста затих
+        if self.analysis_pending:
+            self.analysis_timer += dt
+            if self.analysis_timer >= self.analysis_delay:
+                self.analysis_pending = False
+                # Большие сгенерированные файлы не анализируются
+                if len(self.lines) <= self.analysis_max_lines:
+                    self.analyzer.submit(self.get_code())
+        
+        # Лексер догоняет область просмотра по кусочку за кадр; когда состояния
+        # стали точными, строки перерисовываются
+        if not self.lex_ready:
+            last = min(self.scroll_offset + self.visible_lines, len(self.lines)) - 1
+            with PROFILER.section('tokenize'):
+                self.lex_ready = self.lexer.catch_up(last, self.lines, time.perf_counter() + self.lex_budget)
+            if self.lex_ready:
+                self.dirty = True
+        
+        # Подсчет совпадений поиска идет по кусочку за кадр
+        if self.find_bar.active and self.search.scan(self.lines):
+            self.dirty = True
+            if self.find_pending and self.search.complete:
+                self.find_next(from_cursor=True)
+        
+        # Результат для текста, измененного после отправки, уже не совпадает
+        # со строками: ждем следующего анализа
+        diagnostics = self.analyzer.poll()
+        if diagnostics is not None and not self.analysis_pending:
+            self.diagnostics = diagnostics
+            self.dirty = True
+    
+    def shutdown(self):
+        self.analyzer.stop()
+        self.lines.close()
     
     def get_code(self):
-        return "\n".join(self.lines)
+        return self.lines.get_text()
@@ -0,0 +1,187 @@
+import time
+from collections import deque
+
+# Примерный размер одной операции без текста, для учета памяти
+OP_OVERHEAD = 64
+ROW_OVERHEAD = 16
+COALESCE_TIMEOUT = 1.0
+
+
+def text_end(row, col, text):
+    # Позиция конца текста, вставленного в (row, col)
+    newlines = text.count('\n')
+    if not newlines:
+        return row, col + len(text)
+    return row + newlines, len(text) - text.rfind('\n') - 1
+
+
+def op_size(op):
+    if op[0] == 'r':
+        # Новые тексты - те же объекты, что лежат в буфере, учитываем только старые
+        return OP_OVERHEAD + ROW_OVERHEAD * len(op[1]) + sum(map(len, op[2]))
+    return OP_OVERHEAD + len(op[3])
+
+
+class HistoryEntry:
+    # Шаг отмены: операции в порядке выполнения. Операция - [вид, row, col, text],
+    # где 'i' - вставка text в (row, col), 'd' - удаление text, начинавшегося
+    # в (row, col). Обратная операция получается заменой вида.
+    # Пакетная замена строк хранится как ['r', rows, old_texts, new_texts]
+    def __init__(self):
+        self.ops = []
+        self.size = 0
+        self.kind = None
+        self.time = 0
+
+    def add(self, op):
+        self.ops.append(op)
+        self.size += op_size(op)
+
+
+class EditHistory:
+    # Журнал обратимых правок с ограничением по памяти. Хранятся только
+    # вставленный и удаленный текст, поэтому отмена и повтор стоят
+    # O(размера правки) независимо от размера документа. В лимит памяти
+    # входят и шаги отмены, и шаги повтора
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+        self.suspended = 0
+        self.coalesce = True
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack = []
+        self.size = 0
+
+    # Запись
+
+    def record_insert(self, row, col, text):
+        self.record(['i', row, col, text])
+
+    def record_delete(self, row, col, text):
+        self.record(['d', row, col, text])
+
+    def record_replace(self, old, new):
+        rows = list(new)
+        self.record(['r', rows, [old[row] for row in rows], [new[row] for row in rows]])
+
+    def record(self, op):
+        if self.suspended:
+            return
+        if self.redo_stack:
+            self.size -= sum(entry.size for entry in self.redo_stack)
+            self.redo_stack = []
+        if self.coalesce and self.merge(op):
+            return
+        entry = HistoryEntry()
+        entry.add(op)
+        entry.kind = self.typing_kind(op)
+        entry.time = time.monotonic()
+        self.push(entry)
+        self.coalesce = True
+
+    def typing_kind(self, op):
+        # Набор и удаление по одному символу склеиваются в один шаг
+        kind, row, col, text = op
+        if kind == 'r' or len(text) != 1 or text == '\n':
+            return None
+        return kind
+
+    def merge(self, op):
+        if not self.undo_stack:
+            return False
+        entry = self.undo_stack[-1]
+        kind = self.typing_kind(op)
+        now = time.monotonic()
+        if kind is None or entry.kind != kind or now - entry.time > COALESCE_TIMEOUT:
+            return False
+
+        last = entry.ops[-1]
+        _, row, col, text = op
+        if row != last[1]:
+            return False
+        if kind == 'i':
+            # Пробел после слова начинает новый шаг
+            if col != last[2] + len(last[3]) or (text.isspace() and not last[3][-1].isspace()):
+                return False
+            last[3] += text
+        elif col + 1 == last[2]:
+            # Backspace: удаляемый символ стоит перед уже удаленными
+            last[2] = col
+            last[3] = text + last[3]
+        elif col == last[2]:
+            # Delete: символы удаляются на одном месте
+            last[3] += text
+        else:
+            return False
+
+        entry.size += len(text)
+        entry.time = now
+        self.size += len(text)
+        self.evict()
+        return True
+
+    def push(self, entry):
+        self.undo_stack.append(entry)
+        self.size += entry.size
+        self.evict()
+
+    def evict(self):
+        # Самые старые шаги вытесняются первыми, затем самые дальние шаги повтора
+        while self.size > self.max_bytes and self.undo_stack:
+            self.size -= self.undo_stack.popleft().size
+        while self.size > self.max_bytes and self.redo_stack:
+            self.size -= self.redo_stack.pop(0).size
+
+    # Отмена и повтор
+
+    def undo(self, editor):
+        if not self.undo_stack:
+            return False
+        entry = self.undo_stack.pop()
+        cursor = None
+        self.suspended += 1
+        try:
+            for kind, row, col, text in reversed(entry.ops):
+                if kind == 'r':
+                    editor.replace_lines(dict(zip(row, col)))
+                    cursor = [row[0], 0]
+                elif kind == 'i':
+                    end_row, end_col = text_end(row, col, text)
+                    editor.delete_range(row, col, end_row, end_col)
+                    cursor = [row, col]
+                else:
+                    cursor = list(editor.insert_at(row, col, text))
+        finally:
+            self.suspended -= 1
+        self.redo_stack.append(entry)
+        self.coalesce = False
+        editor.cursor_pos = cursor
+        return True
+
+    def redo(self, editor):
+        if not self.redo_stack:
+            return False
+        entry = self.redo_stack.pop()
+        cursor = None
+        self.suspended += 1
+        try:
+            for kind, row, col, text in entry.ops:
+                if kind == 'r':
+                    editor.replace_lines(dict(zip(row, text)))
+                    cursor = [row[0], 0]
+                elif kind == 'i':
+                    cursor = list(editor.insert_at(row, col, text))
+                else:
+                    end_row, end_col = text_end(row, col, text)
+                    editor.delete_range(row, col, end_row, end_col)
+                    cursor = [row, col]
+        finally:
+            self.suspended -= 1
+        self.undo_stack.append(entry)
+        self.coalesce = False
+        editor.cursor_pos = cursor
+        return True
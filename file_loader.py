@@ -0,0 +1,95 @@
+import os
+import mmap
+from array import array
+from itertools import accumulate, islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INDEX_BLOCK = 1 << 20
+
+
+def build_line_index(data):
+    # Смещения начала каждой строки. С numpy поиск переводов строк выполняется
+    # одним векторным проходом. Без него блоки режутся split, а смещения
+    # складываются итераторами в C: без цикла Python, но с объектом на строку,
+    # примерно в 50 раз медленнее numpy (около 0.3 с на миллион строк)
+    size = len(data)
+    if np is not None and size:
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        offsets = np.empty(len(newlines) + 1, dtype=np.int64)
+        offsets[0] = 0
+        offsets[1:] = newlines + 1
+        return offsets
+
+    offsets = array('q', [0])
+    for block_start in range(0, size, INDEX_BLOCK):
+        pieces = data[block_start:block_start + INDEX_BLOCK].split(b'\n')
+        # Последний кусок продолжается в следующем блоке
+        pieces.pop()
+        # Начало следующей строки = начало куска + его длина + '\n'
+        starts = accumulate(map((1).__add__, map(len, pieces)), initial=block_start)
+        offsets.extend(islice(starts, 1, None))
+    return offsets
+
+
+class MappedFile:
+    # Файл отображается в память; строки декодируются только при обращении
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.size = size
+        self.offsets = build_line_index(self.data)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line_end(self, row):
+        # Конец строки без '\n'
+        if row + 1 < len(self.offsets):
+            return int(self.offsets[row + 1]) - 1
+        return self.size
+
+    def decode(self, start, end):
+        return self.data[start:end].decode(self.encoding, errors='replace').replace('\r\n', '\n')
+
+    def line(self, row):
+        return self.decode(int(self.offsets[row]), self.line_end(row)).rstrip('\r')
+
+    def lines(self, start, stop):
+        return self.text(start, stop).split('\n')
+
+    def text(self, start, stop):
+        # Текст строк [start, stop) одним декодированием
+        text = self.decode(int(self.offsets[start]), self.line_end(stop - 1))
+        return text[:-1] if text.endswith('\r') else text
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+class MappedChunk:
+    # Блок TextBuffer, который еще не был прочитан из файла
+    def __init__(self, mapped, start, stop):
+        self.mapped = mapped
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def materialize(self):
+        return self.mapped.lines(self.start, self.stop)
+
+    def text(self):
+        return self.mapped.text(self.start, self.stop)
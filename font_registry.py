@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+
+import pygame
+
+CACHE_VERSION = 1
+
+
+class FontRegistry:
+    # Общие объекты Font по ключу (имя, размер, жирный, курсив). Пути к файлам
+    # шрифтов ищутся один раз и сохраняются на диск: при следующих запусках
+    # системный список шрифтов не сканируется вовсе
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.paths = {}
+        self.fonts = {}
+        self.lock = threading.Lock()
+        self.warm_thread = None
+        self.cache_dirty = False
+        if cache_path:
+            self.load_cache()
+
+    def set_cache_path(self, cache_path):
+        self.cache_path = cache_path
+        self.load_cache()
+
+    @staticmethod
+    def style_key(name, bold, italic):
+        return f"{name or ''}|{int(bold)}|{int(italic)}"
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != CACHE_VERSION or data.get('pygame') != pygame.version.ver:
+            return
+        with self.lock:
+            for key, entry in data.get('fonts', {}).items():
+                path = entry[0]
+                # Шрифт могли удалить из системы: такой путь найдем заново
+                if path is None or os.path.exists(path):
+                    self.paths.setdefault(key, tuple(entry))
+
+    def save_cache(self):
+        if not self.cache_path or not self.cache_dirty:
+            return
+        with self.lock:
+            data = {'version': CACHE_VERSION, 'pygame': pygame.version.ver,
+                    'fonts': {key: list(entry) for key, entry in self.paths.items()}}
+            self.cache_dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Error writing font cache: {e}")
+
+    def resolve(self, name, bold=False, italic=False):
+        # (путь или None для шрифта pygame по умолчанию, нужен ли
+        # искусственный жирный, нужен ли искусственный курсив)
+        key = self.style_key(name, bold, italic)
+        with self.lock:
+            entry = self.paths.get(key)
+        if entry is not None:
+            return entry
+
+        path = None
+        fake_bold = fake_italic = False
+        if name:
+            # match_font при первом вызове сканирует системные шрифты
+            path = pygame.font.match_font(name, bold, italic)
+            if path and (bold or italic):
+                # Нет отдельного начертания: как SysFont, дорисовываем стиль
+                regular = pygame.font.match_font(name)
+                if path == regular:
+                    fake_bold, fake_italic = bold, italic
+        else:
+            fake_bold, fake_italic = bold, italic
+        if path is None:
+            fake_bold, fake_italic = bold, italic
+
+        entry = (path, fake_bold, fake_italic)
+        with self.lock:
+            self.paths[key] = entry
+            self.cache_dirty = True
+        return entry
+
+    def get(self, name, size, bold=False, italic=False):
+        key = (name, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is not None:
+            return font
+
+        # Фоновый прогрев мог еще не дойти до этого шрифта
+        if self.warm_thread is not None:
+            self.warm_thread.join()
+            self.warm_thread = None
+            self.save_cache()
+        path, fake_bold, fake_italic = self.resolve(name, bold, italic)
+        font = pygame.font.Font(path, size)
+        if fake_bold:
+            font.set_bold(True)
+        if fake_italic:
+            font.set_italic(True)
+        self.fonts[key] = font
+        return font
+
+    def warm(self, specs):
+        # Пути к шрифтам [(name, bold, italic), ...] ищутся в фоновом потоке,
+        # пока создается окно; сами объекты Font создаются при первом get()
+        missing = [spec for spec in specs if self.style_key(*spec) not in self.paths]
+        if not missing:
+            return
+        self.warm_thread = threading.Thread(target=self.resolve_all, args=(missing,), daemon=True)
+        self.warm_thread.start()
+
+    def resolve_all(self, specs):
+        for name, bold, italic in specs:
+            self.resolve(name, bold, italic)
+
+
+FONTS = FontRegistry()
@@ -0,0 +1,194 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+from font_registry import FONTS
+from utils import percentile
+
+FRAME_HISTORY = 600
+MAX_EVENTS = 20000
+
+
+class NullSection:
+    # Пустой контекст: когда профилировщик выключен, замер стоит
+    # одного вызова метода и проверки флага
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = NullSection()
+
+
+class Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class FrameProfiler:
+    # Времена участков кадра в кольцевых буферах: сумма по кадру для
+    # процентилей и отдельные вызовы для Chrome trace
+    def __init__(self, history=FRAME_HISTORY, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.history = history
+        self.frames = deque(maxlen=history)
+        self.samples = {}
+        self.events = deque(maxlen=max_events)
+        self.current = {}
+        self.frame_start = None
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        return Section(self, name)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.current = {}
+        self.frame_start = None
+
+    def clear(self):
+        self.frames.clear()
+        self.samples = {}
+        self.events.clear()
+        self.current = {}
+
+    def begin_frame(self):
+        if self.enabled:
+            self.current = {}
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        now = time.perf_counter()
+        self.frames.append((self.frame_start, now - self.frame_start))
+        # Участки, не вызывавшиеся в этом кадре, получают ноль
+        for name in self.samples.keys() | self.current.keys():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.history)
+            samples.append(self.current.get(name, 0.0))
+        self.frame_start = None
+
+    def add(self, name, start, duration):
+        self.current[name] = self.current.get(name, 0.0) + duration
+        self.events.append((name, start, duration))
+
+    def summary(self):
+        # {name: (p50, p95, p99, max)} в миллисекундах, включая время кадра
+        result = {}
+        series = dict(self.samples)
+        series['frame'] = [duration for _, duration in self.frames]
+        for name, values in series.items():
+            if values:
+                result[name] = tuple(percentile(values, p) * 1000 for p in (0.5, 0.95, 0.99)) + (max(values) * 1000,)
+        return result
+
+    def frame_times(self):
+        return [duration for _, duration in self.frames]
+
+    # Экспорт
+
+    def export_json(self, path):
+        frames = []
+        names = list(self.samples)
+        offset = len(self.frames)
+        for i, (start, duration) in enumerate(self.frames):
+            sections = {}
+            for name in names:
+                samples = self.samples[name]
+                # Буферы участков выровнены по последним кадрам
+                index = len(samples) - offset + i
+                if index >= 0:
+                    sections[name] = round(samples[index] * 1000, 4)
+            frames.append({'start': start, 'total_ms': round(duration * 1000, 4), 'sections': sections})
+        summary = {name: dict(zip(('p50', 'p95', 'p99', 'max'), values))
+                   for name, values in self.summary().items()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary_ms': summary, 'frames': frames}, f, indent=1)
+
+    def export_chrome_trace(self, path):
+        # Формат chrome://tracing и Perfetto: события 'X' с микросекундами
+        events = [{'name': 'frame', 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': 1, 'tid': 1}
+                  for start, duration in self.frames]
+        events += [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': 1, 'tid': 1}
+                   for name, start, duration in self.events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+PROFILER = FrameProfiler()
+
+
+class ProfilerOverlay:
+    # Таблица p50/p95/p99 по участкам и график времени кадра. Статистика
+    # пересчитывается несколько раз в секунду, а не каждый кадр
+    def __init__(self, profiler, x, y, width, height):
+        self.profiler = profiler
+        self.rect = pygame.Rect(x, y, width, height)
+        self.font = FONTS.get("consolas", 12)
+        self.visible = False
+        self.refresh_interval = 0.25
+        self.refresh_timer = 0
+        self.stats = {}
+        self.budget = 1 / 60
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.profiler.set_enabled(self.visible)
+        if self.visible:
+            self.profiler.clear()
+
+    def update(self, dt):
+        if not self.visible:
+            return
+        self.refresh_timer += dt
+        if self.refresh_timer >= self.refresh_interval:
+            self.refresh_timer = 0
+            self.stats = self.profiler.summary()
+
+    def draw(self, screen):
+        overlay = pygame.Surface(self.rect.size)
+        overlay.fill((10, 10, 15))
+        header = self.font.render(f"{'section':<16}{'p50':>7}{'p95':>7}{'p99':>7}{'max':>7}", True, (160, 160, 160))
+        overlay.blit(header, (6, 4))
+        y = 20
+        for name in sorted(self.stats, key=lambda n: (n != 'frame', n)):
+            values = self.stats[name]
+            text = f"{name:<16}" + ''.join(f"{v:7.2f}" for v in values)
+            color = (240, 200, 90) if name == 'frame' else (220, 220, 220)
+            overlay.blit(self.font.render(text, True, color), (6, y))
+            y += 14
+
+        # График: столбец на кадр, линия - бюджет кадра при 60 FPS
+        graph = pygame.Rect(6, y + 6, self.rect.width - 12, self.rect.height - y - 12)
+        if graph.height > 10:
+            pygame.draw.rect(overlay, (30, 30, 40), graph)
+            times = self.profiler.frame_times()[-graph.width:]
+            scale = graph.height / (self.budget * 3)
+            for i, duration in enumerate(times):
+                height = min(graph.height, int(duration * scale))
+                color = (90, 200, 120) if duration <= self.budget else (230, 90, 70)
+                x = graph.right - len(times) + i
+                pygame.draw.line(overlay, color, (x, graph.bottom - 1), (x, graph.bottom - height))
+            budget_y = graph.bottom - int(self.budget * scale)
+            pygame.draw.line(overlay, (160, 160, 160), (graph.left, budget_y), (graph.right, budget_y))
+
+        screen.blit(overlay, self.rect)
+        return self.rect
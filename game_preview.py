@@ -1,91 +1,555 @@
-import pygame
-import sys
 import os
-import subprocess
+import pygame
+import time
 import tempfile
+from worker_pool import WorkerPool
+from shared_frame import SharedFrameBuffer
+from result_cache import ResultCache
+from output_buffer import OutputBuffer
+from glyph_cache import GlyphCache
+from font_registry import FONTS
+from sampling_profiler import read_report, SAMPLE_INTERVAL
+from input_replay import format_stats
+from utils import read_json, discard_report
 
 class GamePreview:
-    def __init__(self, x, y, width, height):
+    def __init__(self, x, y, width, height, cache_dir=None):
         self.rect = pygame.Rect(x, y, width, height)
-        self.surface = pygame.Surface((width, height))
-        self.last_output = None
-        self.error_message = None
+        self.surface = pygame.Surface((width - 20, min(height - 200, (width - 20) * 2 // 3)))
+        # Вывод игры: последние строки stdout/stderr, прокручиваются колесом мыши
+        self.output = OutputBuffer()
+        self.output_bottom = None  # None - следим за концом вывода
+        self.output_line_height = 20
+        self.output_visible = 0
         self.execution_time = 0
-        self.font = pygame.font.SysFont("arial", 14)
+        self.start_info = None
+        self.syntax_error = None
+        self.timeout = 5
+        # Каталог, из которого игра импортирует свои модули и читает файлы
+        self.work_dir = None
+        self.run_timeout = self.timeout
+        # Лимиты процесса игры (None - без ограничения)
+        self.limits = {
+            'cpu_seconds': 10,
+            'memory_bytes': 2 * 1024 ** 3,
+            'open_files': 256,
+        }
+        self.usage_info = None
+        # Profile Run: отчет сэмплирующего профилировщика и таблица горячих функций
+        self.profile = None
+        self.profile_path = None
+        self.profile_sort = 'self'
+        self.profile_reverse = True
+        self.profile_scroll = 0
+        self.profile_visible = 0
+        self.profile_columns = []
+        # Получает отчет по завершении запуска (тепловая карта в редакторе)
+        self.profile_listener = None
+        # Запись ввода и воспроизведение без дисплея: каждый прогон сравнивается
+        # с предыдущим для той же записи
+        self.harness = None
+        self.recording_path = os.path.join(tempfile.gettempdir(), 'python-game-editor-input.json')
+        self.record_timeout = 60
+        self.replay_frames = None
+        self.replay_report_path = None
+        self.replay_stats = None
+        # Живая сессия: процесс игры не перезапускается, измененные функции
+        # подменяются на лету; без таймаута и без лимита CPU
+        self.live = False
+        self.execution = None
+        # Запуски, замененные новым: убиты, но еще не завершились. Их
+        # временные файлы удаляются в update(), когда процесс выйдет
+        self.abandoned = []
+        self.progress_timer = 0
+        self.font = FONTS.get("arial", 14)
+        self.line_cache = GlyphCache(self.font, max_size=512)
+        
+        # Встроенный режим: игра рисует кадры в общую память, превью их показывает
+        self.embed = False
+        self.embed_fps = 30
+        self.frame_buffer = None
+        self.frame_timer = 0
+        self.has_frame = False
+        
+        # Кэш результатов по хэшу кода и версии интерпретатора
+        self.result_cache = ResultCache(disk_dir=cache_dir)
+        self.cache_key = None
+        # Файл, в который воркер пишет, открывал ли запуск окно или читал ввод
+        self.status_path = None
+        self.from_cache = False
+        
+        # Пул заранее запущенных воркеров с уже импортированным pygame
+        self.pool = WorkerPool(size=2)
+        self.dirty = True
+    
+    def draw_dirty(self, screen):
+        if self.dirty:
+            self.draw(screen)
+            return [self.rect]
+        return []
     
     def draw(self, screen):
         # Фон превью
         pygame.draw.rect(screen, (25, 25, 35), self.rect)
         
         # Заголовок
-        title_font = pygame.font.SysFont("arial", 18, bold=True)
+        title_font = FONTS.get("arial", 18, bold=True)
         title = title_font.render("Game Preview", True, (220, 220, 220))
         screen.blit(title, (self.rect.centerx - title.get_width() // 2, self.rect.top + 10))
         
-        # Время выполнения
-        time_text = self.font.render(f"Execution time: {self.execution_time:.3f}s", True, (220, 220, 220))
+        # Время выполнения или прогресс текущего запуска
+        if self.execution and self.live:
+            time_text = self.font.render(f"Live session: {self.execution.elapsed():.1f}s, edits apply on the next frame",
+                                         True, (100, 200, 255))
+        elif self.execution:
+            elapsed = self.execution.elapsed()
+            time_text = self.font.render(f"Running... {elapsed:.1f}s / {self.run_timeout}s", True, (220, 220, 220))
+            bar_rect = pygame.Rect(self.rect.left + 20 + time_text.get_width(), self.rect.top + 44, 150, 10)
+            pygame.draw.rect(screen, (60, 60, 75), bar_rect)
+            progress = min(1.0, elapsed / self.run_timeout)
+            pygame.draw.rect(screen, (70, 130, 180), (bar_rect.left, bar_rect.top, int(bar_rect.width * progress), bar_rect.height))
+        else:
+            cached = " (cached)" if self.from_cache else ""
+            time_text = self.font.render(f"Execution time: {self.execution_time:.3f}s{cached}", True, (220, 220, 220))
         screen.blit(time_text, (self.rect.left + 10, self.rect.top + 40))
         
-        # Ошибки или вывод
-        if self.error_message:
-            error_text = self.font.render("Error:", True, (255, 100, 100))
-            screen.blit(error_text, (self.rect.left + 10, self.rect.top + 70))
-            
-            y_offset = 100
-            for line in self.error_message.split('\n'):
-                if y_offset < self.rect.height - 30:
-                    error_line = self.font.render(line, True, (255, 100, 100))
-                    screen.blit(error_line, (self.rect.left + 20, self.rect.top + y_offset))
-                    y_offset += 20
-        elif self.last_output:
-            output_text = self.font.render("Output:", True, (100, 255, 150))
-            screen.blit(output_text, (self.rect.left + 10, self.rect.top + 70))
-            
-            y_offset = 100
-            for line in self.last_output.split('\n'):
-                if y_offset < self.rect.height - 30:
-                    output_line = self.font.render(line, True, (100, 255, 150))
-                    screen.blit(output_line, (self.rect.left + 20, self.rect.top + y_offset))
-                    y_offset += 20
-        else:
+        # Задержка старта воркера
+        if self.start_info:
+            kind, latency = self.start_info
+            start_text = self.font.render(f"Worker start: {kind} {latency * 1000:.0f} ms", True, (160, 160, 170))
+            screen.blit(start_text, (self.rect.right - start_text.get_width() - 10, self.rect.top + 40))
+        
+        # Ресурсы последнего запуска и причина завершения
+        if self.usage_info and not self.execution:
+            usage_text = self.font.render(self.usage_info, True, (160, 160, 170))
+            screen.blit(usage_text, (self.rect.left + 10, self.rect.top + 58))
+        
+        # Кадр встроенной игры
+        text_top = 80
+        if self.has_frame:
+            screen.blit(self.surface, (self.rect.left + 10, self.rect.top + 80))
+            text_top += self.surface.get_height() + 10
+        
+        # Таблица профиля, ошибки или вывод
+        if self.profile and self.profile['samples']:
+            self.draw_profile(screen, text_top)
+        elif len(self.output):
+            self.draw_output(screen, text_top)
+        elif not self.has_frame:
             help_text = self.font.render("Write your game code and click 'Run' to see preview", True, (220, 220, 220))
             screen.blit(help_text, (self.rect.centerx - help_text.get_width() // 2, self.rect.centery))
+        
+        self.dirty = False
     
-    def execute_code(self, code):
-        start_time = pygame.time.get_ticks()
+    def output_window(self, text_top):
+        # Область вывода и число строк, которые в нее помещаются
+        area = pygame.Rect(self.rect.left + 10, self.rect.top + text_top + 30,
+                           self.rect.width - 20, self.rect.height - text_top - 60)
+        return area, max(0, area.height // self.output_line_height)
+    
+    def draw_output(self, screen, text_top):
+        # Рисуются только видимые строки; поверхности строк берутся из кэша
+        area, visible = self.output_window(text_top)
+        self.output_visible = visible
+        end = self.output.end if self.output_bottom is None else self.output_bottom
+        lines = self.output.window(end, visible)
+        
+        if self.output.has_errors:
+            label, label_color = "Error:", (255, 100, 100)
+        else:
+            label, label_color = "Output:", (100, 255, 150)
+        if len(self.output) > visible:
+            first = max(self.output.start, min(end, self.output.end) - visible)
+            label += f"  lines {first + 1}-{first + len(lines)} of {self.output.end} (scroll for more)"
+        screen.blit(self.line_cache.render(label, label_color), (self.rect.left + 10, self.rect.top + text_top))
+        
+        screen.set_clip(area)
+        y = area.top
+        for stream, text in lines:
+            color = (255, 100, 100) if stream == 'stderr' else (100, 255, 150)
+            if text:
+                # Дальше правого края строка все равно не видна
+                screen.blit(self.line_cache.render(text[:300], color), (area.left + 10, y))
+            y += self.output_line_height
+        screen.set_clip(None)
+    
+    def profile_rows(self):
+        # [(функция, строка, собственные сэмплы, всего сэмплов)] в порядке сортировки
+        rows = [tuple(entry) for entry in self.profile['functions']]
+        index = {'function': 0, 'line': 1, 'self': 2, 'total': 3}[self.profile_sort]
+        return sorted(rows, key=lambda row: (row[index], row[1]), reverse=self.profile_reverse)
+    
+    def draw_profile(self, screen, text_top):
+        profile = self.profile
+        samples = profile['samples']
+        label = (f"Profile: {samples} samples ({profile['mode']}, {profile['interval'] * 1000:.0f} ms), "
+                 f"{profile['duration']:.1f}s  - click a column to sort")
+        screen.blit(self.line_cache.render(label, (100, 200, 255)), (self.rect.left + 10, self.rect.top + text_top))
+        
+        area, visible = self.output_window(text_top + self.output_line_height)
+        if self.output.has_errors:
+            # Последняя строка ошибки остается видна над таблицей
+            error = self.output.text('stderr').rstrip('\n').rsplit('\n', 1)[-1]
+            screen.blit(self.line_cache.render(error[:120], (255, 100, 100)),
+                        (self.rect.left + 10, self.rect.top + text_top + self.output_line_height))
+        
+        # Заголовок таблицы: клик по столбцу сортирует по нему
+        widths = [('function', "Function", area.width - 250), ('line', "Line", 60),
+                  ('self', "Self %", 90), ('total', "Total %", 90)]
+        self.profile_columns = []
+        x = area.left
+        for key, title, width in widths:
+            if key == self.profile_sort:
+                title += " v" if self.profile_reverse else " ^"
+            color = (240, 200, 90) if key == self.profile_sort else (160, 160, 170)
+            screen.blit(self.line_cache.render(title, color), (x + 4, area.top))
+            self.profile_columns.append((key, pygame.Rect(x, area.top, width, self.output_line_height)))
+            x += width
+        pygame.draw.line(screen, (60, 60, 75), (area.left, area.top + self.output_line_height - 2),
+                         (area.right, area.top + self.output_line_height - 2))
+        
+        rows = self.profile_rows()
+        self.profile_visible = max(0, visible - 1)
+        self.profile_scroll = max(0, min(self.profile_scroll, len(rows) - self.profile_visible))
+        screen.set_clip(area)
+        y = area.top + self.output_line_height
+        for name, first_line, self_count, total in rows[self.profile_scroll:self.profile_scroll + self.profile_visible]:
+            share = self_count / samples
+            # Полоса за строкой показывает долю собственного времени
+            pygame.draw.rect(screen, (90, 45, 40), (area.left, y + 2, int((area.width - 20) * share), self.output_line_height - 4))
+            cells = [name, str(first_line), f"{share * 100:.1f}", f"{total / samples * 100:.1f}"]
+            x = area.left
+            for cell, (_, _, width) in zip(cells, widths):
+                screen.blit(self.line_cache.render(cell, (220, 220, 220)), (x + 4, y))
+                x += width
+            y += self.output_line_height
+        screen.set_clip(None)
+    
+    def sort_profile(self, column):
+        if column == self.profile_sort:
+            self.profile_reverse = not self.profile_reverse
+        else:
+            self.profile_sort = column
+            # Имена по алфавиту, числа - от больших к меньшим
+            self.profile_reverse = column in ('self', 'total')
+        self.profile_scroll = 0
+        self.dirty = True
+    
+    def handle_event(self, event):
+        showing_profile = self.profile and self.profile['samples']
+        if event.type == pygame.MOUSEWHEEL and self.rect.collidepoint(pygame.mouse.get_pos()):
+            if showing_profile:
+                self.profile_scroll = max(0, self.profile_scroll - event.y * 3)
+                self.dirty = True
+            else:
+                self.scroll_output(-event.y * 3)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and showing_profile:
+            for column, rect in self.profile_columns:
+                if rect.collidepoint(event.pos):
+                    self.sort_profile(column)
+    
+    def scroll_output(self, delta):
+        end = self.output.end if self.output_bottom is None else self.output_bottom
+        end = max(self.output.start + self.output_visible, end + delta)
+        # Долистали до конца - снова следим за новым выводом
+        self.output_bottom = None if end >= self.output.end else end
+        self.dirty = True
+    
+    def execute_code(self, code, bypass_cache=False, profile=False, harness=None, live=False):
+        # Запуск не блокирует цикл редактора: вывод приходит в update().
+        # profile - запуск под сэмплирующим профилировщиком, harness -
+        # 'record' (запись ввода) или 'replay' (воспроизведение без дисплея),
+        # live - живая сессия с подменой функций при правках
+        self.abandon()
+        self.harness = harness
+        self.live = live
+        self.run_timeout = self.record_timeout if harness else self.timeout
+        self.profile = None
+        self.profile_scroll = 0
+        self.output.clear()
+        self.output_bottom = None
+        self.start_info = None
+        self.usage_info = None
+        self.has_frame = False
+        self.from_cache = False
+        self.syntax_error = None
+        self.dirty = True
+        
+        # Синтаксис проверяется в процессе редактора, без запуска воркера
+        compiled = self.compile_code(code)
+        if compiled is None:
+            return
+        
+        # Кадры встроенного режима, профили, замеры и живые сессии не кэшируются
+        self.cache_key = None
+        if not self.embed and not profile and not harness and not live:
+            # Версия в ключе отсекает записи, сохраненные без проверки интерактивности
+            self.cache_key = self.result_cache.key(code, 'non-interactive')
+            entry = None if bypass_cache else self.result_cache.get(self.cache_key)
+            if entry is not None:
+                self.show_cached_result(entry)
+                return
         
         try:
-            # Создаем временный файл для выполнения кода
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                f.write(code)
-                temp_file = f.name
-            
-            # Выполняем код и перехватываем вывод
-            result = subprocess.run([sys.executable, temp_file], 
-                                  capture_output=True, text=True, timeout=5)
-            
-            self.last_output = result.stdout
-            self.error_message = result.stderr if result.stderr else None
-            
-            # Удаляем временный файл
-            os.unlink(temp_file)
-            
-        except subprocess.TimeoutExpired:
-            self.error_message = "Execution timed out (5 seconds)"
-            self.last_output = None
+            header = self.run_header()
+            if self.cache_key:
+                header['status'] = self.new_status_path()
+            if profile:
+                header['profile'] = {'path': self.new_profile_path(), 'interval': SAMPLE_INTERVAL}
+            if harness:
+                header.update(self.harness_header(harness))
+            if live:
+                # Воркеру нужен исходный текст: с ним сравниваются новые версии
+                header['live'] = True
+                header.get('limits', {}).pop('cpu_seconds', None)
+                self.execution = self.pool.start(code, timeout=None, header=header)
+            else:
+                # Исходник нужен воркеру только для строк в трассировках
+                header['source'] = code
+                self.execution = self.pool.start(compiled, timeout=self.run_timeout, header=header)
         except Exception as e:
-            self.error_message = f"Execution error: {str(e)}"
-            self.last_output = None
+            self.output.add_line('stderr', f"Execution error: {str(e)}")
+        self.dirty = True
+    
+    def compile_code(self, code):
+        start = time.perf_counter()
+        try:
+            return compile(code, '<editor>', 'exec', dont_inherit=True)
+        except SyntaxError as e:
+            self.execution_time = time.perf_counter() - start
+            # Строка и столбец в нумерации CodeEditor (с нуля)
+            line = (e.lineno or 1) - 1
+            col = max(0, (e.offset or 1) - 1)
+            self.syntax_error = (line, col, e.msg)
+            message = [f"SyntaxError: {e.msg} (line {line + 1}, column {col + 1})"]
+            if e.text:
+                message.append("    " + e.text.rstrip('\n'))
+                message.append("    " + " " * col + "^")
+            self.output.add_line('stderr', '\n'.join(message))
+            return None
+    
+    def show_cached_result(self, entry):
+        self.output.append('stdout', entry['stdout'])
+        self.output.append('stderr', entry['stderr'])
+        self.execution_time = entry['elapsed']
+        self.from_cache = True
+    
+    def run_header(self):
+        # Запись идет в обычном окне, а замер - без публикации кадров
+        header = {} if self.harness else (self.embed_header() or {})
+        limits = {name: value for name, value in self.limits.items() if value is not None}
+        if limits:
+            header['limits'] = limits
+        if self.work_dir:
+            header['cwd'] = self.work_dir
+        return header
+    
+    def new_status_path(self):
+        fd, self.status_path = tempfile.mkstemp(prefix='game-status-', suffix='.json')
+        os.close(fd)
+        return self.status_path
+    
+    def take_status(self):
+        # Статус запуска от воркера или None, если он не успел его записать
+        path, self.status_path = self.status_path, None
+        if path is None:
+            return None
+        status = read_json(path)
+        discard_report(path)
+        return status
+    
+    def new_profile_path(self):
+        fd, self.profile_path = tempfile.mkstemp(prefix='game-profile-', suffix='.json')
+        os.close(fd)
+        return self.profile_path
+    
+    def collect_profile(self):
+        # Отчет пишется воркером периодически, поэтому он есть и после таймаута
+        path, self.profile_path = self.profile_path, None
+        self.profile = read_report(path)
+        discard_report(path)
+        if self.profile is None:
+            self.output.add_line('stderr', "Profile: no samples were recorded")
+        if self.profile_listener:
+            self.profile_listener(self.profile)
+    
+    def is_live(self):
+        return self.live and self.execution is not None and not self.execution.cancelled
+    
+    def push_live_code(self, code):
+        # Новая версия буфера для живой сессии. Код с синтаксической ошибкой
+        # (правка еще не закончена) не отправляется. False - сессия еще
+        # не готова принять код, стоит повторить позже
+        if not self.is_live():
+            return True
+        try:
+            compile(code, '<editor>', 'exec', dont_inherit=True)
+        except (SyntaxError, ValueError):
+            return True
+        return self.execution.send(code)
+    
+    def harness_header(self, harness):
+        if harness == 'record':
+            return {'record': {'recording': self.recording_path}}
+        fd, self.replay_report_path = tempfile.mkstemp(prefix='game-replay-', suffix='.json')
+        os.close(fd)
+        recording = self.recording_path if os.path.exists(self.recording_path) else None
+        return {'replay': {'recording': recording, 'report': self.replay_report_path,
+                           'frames': self.replay_frames}}
+    
+    def collect_harness(self):
+        if self.harness == 'record':
+            recording = read_json(self.recording_path)
+            frames = recording['frames'] if recording else 0
+            self.output.add_line('stdout', f"Recorded {frames} frames of input")
+            # Новая запись - новая база для сравнения
+            self.replay_stats = None
+            return
+        path, self.replay_report_path = self.replay_report_path, None
+        report = read_json(path)
+        discard_report(path)
+        if report is None:
+            self.output.add_line('stderr', "Replay: no frame timings were recorded")
+            return
+        stats = report['stats']
+        self.output.add_line('stdout', "Replay: " + format_stats(stats, self.replay_stats))
+        if self.replay_stats:
+            self.output.add_line('stdout', "Previous: " + format_stats(self.replay_stats))
+        self.replay_stats = stats
+    
+    def embed_header(self):
+        if not self.embed:
+            return None
+        if self.frame_buffer is None:
+            self.frame_buffer = SharedFrameBuffer()
+        self.frame_buffer.reset()
+        return {'embed': {'shm': self.frame_buffer.name, 'fps': self.embed_fps,
+                          'max_size': self.frame_buffer.max_size}}
+    
+    def update(self, dt):
+        self.collect_abandoned()
+        if not self.execution:
+            return
+        
+        # Новые кадры забираем с заданной частотой
+        if self.embed and self.frame_buffer:
+            self.frame_timer += dt
+            if self.frame_timer >= 1.0 / self.embed_fps:
+                self.frame_timer = 0
+                if self.frame_buffer.read_into(self.surface):
+                    self.has_frame = True
+                    self.dirty = True
+        
+        for stream, text in self.execution.poll_output():
+            self.output.append(stream, text)
+            self.dirty = True
+        
+        # Индикатор прогресса обновляется 10 раз в секунду
+        self.progress_timer += dt
+        if self.progress_timer >= 0.1:
+            self.progress_timer = 0
+            self.dirty = True
         
-        self.execution_time = (pygame.time.get_ticks() - start_time) / 1000.0
+        if self.execution.done.is_set() and self.execution.output.empty():
+            self.finish_execution()
+    
+    def finish_execution(self):
+        result = self.execution.result
+        self.execution = None
+        self.execution_time = result.elapsed
+        if result.start_kind:
+            self.start_info = (result.start_kind, result.start_latency)
+        self.usage_info = self.format_usage(result)
+        status = self.take_status()
+        
+        if result.error:
+            self.output.add_line('stderr', f"Execution error: {result.error}")
+        elif result.cancelled:
+            self.output.add_line('stderr', "Execution cancelled")
+        elif result.timed_out:
+            self.output.add_line('stderr', f"Execution timed out ({self.run_timeout} seconds)")
+        elif self.cache_key and not result.truncated and status and not status['interactive']:
+            # В кэш попадают только завершившиеся сами по себе запуски
+            # с полностью сохраненным выводом, не открывавшие окно и не
+            # читавшие ввод: игру из кэша запустить нельзя
+            self.result_cache.put(self.cache_key, result.stdout, result.stderr,
+                                  result.returncode, result.elapsed)
+        self.cache_key = None
+        if self.profile_path:
+            self.collect_profile()
+        if self.harness and not result.cancelled:
+            self.collect_harness()
+        self.harness = None
+        self.live = False
+        self.dirty = True
+    
+    def format_usage(self, result):
+        parts = []
+        if result.user_time is not None:
+            parts.append(f"CPU {result.user_time:.2f}s user, {result.system_time:.2f}s sys")
+        if result.peak_rss is not None:
+            parts.append(f"peak RSS {result.peak_rss / (1024 * 1024):.1f} MB")
+        parts.append(f"exit: {result.exit_reason}")
+        return " | ".join(parts)
+    
+    def is_running(self):
+        return self.execution is not None
+    
+    def cancel(self):
+        # Процесс убивается сразу, а запуск собирается в update(), как при
+        # обычном завершении: кадр не ждет потоков чтения и холодного воркера
+        if self.execution:
+            self.execution.cancel()
+    
+    def abandon(self):
+        # Текущий запуск уступает место новому: его вывод и отчеты не нужны
+        if not self.execution:
+            return
+        self.execution.cancel()
+        paths = [path for path in (self.status_path, self.profile_path, self.replay_report_path) if path]
+        self.abandoned.append((self.execution, paths))
+        self.execution = None
+        self.status_path = self.profile_path = self.replay_report_path = None
+    
+    def collect_abandoned(self):
+        for entry in list(self.abandoned):
+            execution, paths = entry
+            if execution.done.is_set():
+                self.abandoned.remove(entry)
+                for path in paths:
+                    discard_report(path)
+    
+    def set_embed(self, embed):
+        self.embed = embed
+        self.dirty = True
+    
+    def shutdown(self):
+        self.abandon()
+        for execution, paths in self.abandoned:
+            execution.wait()
+        self.collect_abandoned()
+        self.pool.shutdown()
+        if self.frame_buffer:
+            self.frame_buffer.close()
+            self.frame_buffer = None
 
 class Button:
-    def __init__(self, x, y, width, height, text, action=None):
+    def __init__(self, x, y, width, height, text, action=None, background=(30, 30, 40)):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.action = action
         self.hovered = False
-        self.font = pygame.font.SysFont("arial", 16)
+        self.font = FONTS.get("arial", 16)
+        self.background = background
+        self.dirty = True
+    
+    def draw_dirty(self, screen):
+        if self.dirty:
+            # Скругленные углы не закрывают фон, поэтому сначала стираем его
+            pygame.draw.rect(screen, self.background, self.rect)
+            self.draw(screen)
+            return [self.rect]
+        return []
     
     def draw(self, screen):
         color = (100, 160, 210) if self.hovered else (70, 130, 180)
@@ -95,10 +559,14 @@ class Button:
         text_surface = self.font.render(self.text, True, (220, 220, 220))
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
+        self.dirty = False
     
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
-            self.hovered = self.rect.collidepoint(event.pos)
+            hovered = self.rect.collidepoint(event.pos)
+            if hovered != self.hovered:
+                self.hovered = hovered
+                self.dirty = True
         elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.hovered and self.action:
                 return self.action()
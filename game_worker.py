@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import marshal
+import linecache
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+# Прогрев: тяжелые импорты выполняются до того, как придет код пользователя
+import math
+import random
+import pygame
+
+from worker_pool import READY_MARKER
+from sampling_profiler import SamplingProfiler, SAMPLE_INTERVAL
+from input_replay import InputHarness
+from live_reload import LiveSession
+
+
+def read_job(stream):
+    header_line = stream.readline()
+    if not header_line:
+        return None, None
+    header = json.loads(header_line)
+    payload = stream.read(header['size'])
+    return header, payload
+
+
+def apply_limits(limits):
+    # Лимиты ставятся после прогрева, поэтому импорт pygame в них не входит.
+    # Мягкий предел CPU присылает SIGXCPU, жесткий через секунду - SIGKILL
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    warmup_cpu = usage.ru_utime + usage.ru_stime
+    for name, kind, extra in (('cpu_seconds', resource.RLIMIT_CPU, 1),
+                              ('memory_bytes', resource.RLIMIT_AS, 0),
+                              ('open_files', resource.RLIMIT_NOFILE, 0)):
+        value = limits.get(name)
+        if value is None:
+            continue
+        soft, hard = resource.getrlimit(kind)
+        if kind == resource.RLIMIT_CPU:
+            # Лимит CPU считается от старта процесса: добавляем точное время
+            # прогрева и округляем вверх до целых секунд, как требует setrlimit
+            value = math.ceil(value + warmup_cpu)
+        else:
+            value = int(value)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard - extra)
+        try:
+            resource.setrlimit(kind, (value, value + extra))
+        except (ValueError, OSError):
+            pass
+
+
+def track_interaction(status):
+    # Запуск, открывший окно или читавший ввод, - это игра, а не скрипт:
+    # его результат нельзя воспроизводить из кэша
+    def tracked(module, name):
+        original = getattr(module, name)
+
+        def wrapper(*args, **kwargs):
+            status['interactive'] = True
+            return original(*args, **kwargs)
+
+        setattr(module, name, wrapper)
+
+    for module, name in ((pygame.display, 'set_mode'), (pygame.event, 'get'), (pygame.event, 'poll'),
+                         (pygame.event, 'wait'), (pygame.event, 'pump'), (pygame.event, 'peek'),
+                         (pygame.key, 'get_pressed'), (pygame.mouse, 'get_pos'), (pygame.mouse, 'get_pressed')):
+        tracked(module, name)
+
+
+def write_status(path, status):
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def install_embed(options):
+    # Окно игры не создается: SDL рисует в память, а кадры публикуются
+    # в общий буфер, который редактор показывает в панели превью
+    from shared_frame import SharedFrameBuffer
+
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    frames = SharedFrameBuffer(options['shm'], options['max_size'])
+    interval = 1.0 / options.get('fps', 30)
+    last_publish = [0.0]
+    original_flip = pygame.display.flip
+    original_update = pygame.display.update
+
+    def publish():
+        now = time.perf_counter()
+        surface = pygame.display.get_surface()
+        if surface is not None and now - last_publish[0] >= interval:
+            frames.write(surface)
+            last_publish[0] = now
+
+    def flip():
+        original_flip()
+        publish()
+
+    def update(*args, **kwargs):
+        original_update(*args, **kwargs)
+        publish()
+
+    pygame.display.flip = flip
+    pygame.display.update = update
+
+
+def register_source(filename, source):
+    # У кода из редактора нет файла на диске: без записи в linecache
+    # трассировки показывают только File "<editor>", line N без самой строки
+    if source is not None and not os.path.exists(filename):
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+
+def use_script_path(filename, cwd):
+    # Как при запуске python script.py: первым в sys.path идет каталог скрипта
+    # (для несохраненного кода - каталог из заголовка), а не каталог редактора.
+    # Уже загруженные модули редактора выгружаются, чтобы import search или
+    # import main в игре находил модули игры
+    if os.path.exists(filename):
+        script_dir = os.path.dirname(os.path.abspath(filename))
+    else:
+        script_dir = os.path.abspath(cwd or os.getcwd())
+    editor_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[0] = script_dir
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if name != '__main__' and path and os.path.dirname(os.path.abspath(path)) == editor_dir:
+            del sys.modules[name]
+
+
+def run_job(header, payload):
+    filename = header.get('filename', '<editor>')
+    source = None
+    if header.get('format') == 'marshal':
+        code = marshal.loads(payload)
+        filename = code.co_filename
+        source = header.get('source')
+    else:
+        source = payload.decode('utf-8')
+        try:
+            code = compile(source, filename, 'exec')
+        except SyntaxError as e:
+            traceback.print_exception(type(e), e, None)
+            return 1
+
+    status = {'interactive': False}
+    if header.get('status'):
+        track_interaction(status)
+    if header.get('embed'):
+        install_embed(header['embed'])
+    if header.get('limits'):
+        apply_limits(header['limits'])
+
+    # Каждый запуск получает чистое пространство имен
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    if os.path.exists(filename):
+        namespace['__file__'] = filename
+    sys.argv = [filename]
+    register_source(filename, source)
+    use_script_path(filename, header.get('cwd'))
+    if header.get('cwd'):
+        os.chdir(header['cwd'])
+
+    # Запись ввода или воспроизведение без дисплея для замера времени кадра
+    harness = None
+    for mode in ('record', 'replay'):
+        if header.get(mode):
+            harness = InputHarness(mode, header[mode])
+            harness.install()
+
+    # Живая сессия: новые версии функций приходят через stdin
+    if header.get('live') and source is not None:
+        LiveSession(namespace, filename, source, read_job).install()
+
+    profiler = None
+    if header.get('profile'):
+        options = header['profile']
+        profiler = SamplingProfiler(options['path'], filename, options.get('interval', SAMPLE_INTERVAL))
+        profiler.start()
+
+    try:
+        exec(code, namespace)
+    except SystemExit:
+        raise
+    except BaseException as e:
+        # Кадр самого воркера в трассировке не показываем
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        sys.stderr.flush()
+        return 1
+    finally:
+        if profiler:
+            profiler.stop()
+        if harness:
+            harness.finish()
+        if header.get('status'):
+            write_status(header['status'], status)
+    return 0
+
+
+def main():
+    sys.stdout.buffer.write(READY_MARKER)
+    sys.stdout.flush()
+
+    header, payload = read_job(sys.stdin.buffer)
+    if header is None:
+        return 0
+    if not header.get('live'):
+        return run_job(header, payload)
+
+    # Поток живой сессии до конца ждет патчи на stdin, и обычное завершение
+    # интерпретатора падает на блокировке stdin: выходим сразу
+    try:
+        code = run_job(header, payload)
+    except SystemExit as e:
+        code = e.code
+        if code is not None and not isinstance(code, int):
+            print(code, file=sys.stderr)
+            code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code or 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+from bisect import bisect_right
+from collections import OrderedDict
+
+from frame_profiler import PROFILER
+
+
+class SurfaceCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = build()
+        self.surfaces[key] = surface
+        # Вытесняем самые давно использованные поверхности
+        while len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.surfaces),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self):
+        return len(self.surfaces)
+
+
+class GlyphCache(SurfaceCache):
+    def __init__(self, font, max_size=2048):
+        super().__init__(max_size)
+        self.font = font
+
+    def render(self, text, color):
+        return self.get((text, color), lambda: self.build(text, color))
+
+    def build(self, text, color):
+        with PROFILER.section('font.render'):
+            return self.font.render(text, True, color)
+
+
+class GlyphMetrics:
+    # Таблица ширин символов строится один раз для шрифта. Для моноширинного
+    # шрифта перевод столбец <-> пиксели выполняется за O(1), для остальных
+    # используются префиксные суммы, закэшированные по тексту строки.
+    # Ширины дробные: font.size() одного символа отбрасывает дробную часть
+    # и на длинных строках набегает ошибка в десятки пикселей
+    SAMPLE = 32
+
+    def __init__(self, font, max_lines=512):
+        self.font = font
+        self.advances = {}
+        for code in range(32, 127):
+            self.advance(chr(code))
+        self.char_width = self.advances['M']
+        self.monospace = max(self.advances.values()) - min(self.advances.values()) < 0.01
+        self.max_lines = max_lines
+        self.prefix_cache = OrderedDict()
+
+    def advance(self, char):
+        width = self.advances.get(char)
+        if width is None:
+            width = self.advances[char] = self.font.size(char * self.SAMPLE)[0] / self.SAMPLE
+        return width
+
+    def is_fixed(self, line):
+        return self.monospace and line.isascii() and '\t' not in line
+
+    def prefix(self, line):
+        entry = self.prefix_cache.get(line)
+        if entry is not None:
+            self.prefix_cache.move_to_end(line)
+            return entry
+
+        offsets = [0]
+        midpoints = []
+        x = 0
+        for char in line:
+            width = self.advance(char)
+            midpoints.append(x + width / 2)
+            x += width
+            offsets.append(x)
+        entry = (offsets, midpoints)
+        self.prefix_cache[line] = entry
+        if len(self.prefix_cache) > self.max_lines:
+            self.prefix_cache.popitem(last=False)
+        return entry
+
+    def col_to_x(self, line, col):
+        if self.is_fixed(line):
+            return round(min(col, len(line)) * self.char_width)
+        return round(self.prefix(line)[0][min(col, len(line))])
+
+    def x_to_col(self, line, x):
+        # Столбец ближайшей к x границы между символами
+        if self.is_fixed(line):
+            if x < self.char_width / 2:
+                return 0
+            return min(len(line), int((x - self.char_width / 2) // self.char_width) + 1)
+        return bisect_right(self.prefix(line)[1], x)
+
+    def text_width(self, line):
+        return self.col_to_x(line, len(line))
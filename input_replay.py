@@ -0,0 +1,378 @@
+# Запись и воспроизведение ввода игры для повторяемых замеров времени кадра:
+#
+#     python input_replay.py record game.py --input session.json
+#     python input_replay.py replay game.py --input session.json --output stats.json
+#     python input_replay.py replay --template --frames 600 --baseline stats.json
+#
+# Запись идет в обычном окне. Воспроизведение - без дисплея (SDL dummy) с тем
+# же зерном random и тем же числом кадров; Clock.tick не спит, поэтому время
+# кадра - это только работа игры. Результаты двух прогонов можно сравнить
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+import pygame
+
+from templates import DEFAULT_TEMPLATE
+from utils import percentile, read_json, discard_report
+
+DEFAULT_SEED = 0
+DEFAULT_FPS = 60
+DEFAULT_FRAMES = 600
+FLUSH_INTERVAL = 0.5
+
+
+def frame_stats(times):
+    # Времена кадров в секундах -> сводка в миллисекундах
+    if not times:
+        return {'frames': 0}
+    return {
+        'frames': len(times),
+        'mean_ms': sum(times) / len(times) * 1000,
+        'p50_ms': percentile(times, 0.5) * 1000,
+        'p95_ms': percentile(times, 0.95) * 1000,
+        'worst_ms': max(times) * 1000,
+    }
+
+
+def format_stats(stats, baseline=None):
+    if not stats.get('frames'):
+        return "no frames were rendered"
+    parts = [f"{stats['frames']} frames"]
+    for key, title in (('mean_ms', 'mean'), ('p95_ms', 'p95'), ('worst_ms', 'worst')):
+        text = f"{title} {stats[key]:.2f} ms"
+        if baseline and baseline.get(key):
+            text += f" ({(stats[key] / baseline[key] - 1) * 100:+.1f}%)"
+        parts.append(text)
+    return ", ".join(parts)
+
+
+def encode_event(event):
+    # В событиях бывают объекты окна и т.п.; сохраняем только простые значения
+    data = {}
+    for key, value in event.dict.items():
+        if isinstance(value, (bool, int, float, str)):
+            data[key] = value
+        elif isinstance(value, tuple) and all(isinstance(v, (int, float)) for v in value):
+            data[key] = list(value)
+    return [event.type, data]
+
+
+def decode_event(entry):
+    event_type, data = entry
+    return pygame.event.Event(event_type, {key: tuple(value) if isinstance(value, list) else value
+                                           for key, value in data.items()})
+
+
+def encode_keys(pressed):
+    return [len(pressed), [i for i, down in enumerate(pressed) if down]]
+
+
+def decode_keys(value):
+    size, down = value
+    down = set(down)
+    return pygame.key.ScancodeWrapper(tuple(i in down for i in range(size)))
+
+
+class HarnessClock:
+    # Замена pygame.time.Clock: tick всегда возвращает длительность кадра при
+    # заданном FPS, чтобы логика игры не зависела от реального времени. При
+    # записи настоящий Clock по-прежнему ограничивает частоту кадров
+    def __init__(self, harness):
+        self.harness = harness
+        self.clock = harness.original['Clock']() if harness.mode == 'record' else None
+        self.fps = harness.fps
+
+    def tick(self, framerate=0):
+        if framerate:
+            self.fps = framerate
+        if self.clock is not None:
+            start = time.perf_counter()
+            self.clock.tick(framerate)
+            self.harness.idle += time.perf_counter() - start
+        return self.get_time()
+
+    tick_busy_loop = tick
+
+    def get_time(self):
+        return int(1000 / (self.fps or self.harness.fps))
+
+    def get_rawtime(self):
+        return self.get_time()
+
+    def get_fps(self):
+        return float(self.fps or self.harness.fps)
+
+
+class InputHarness:
+    # Устанавливается в воркере до запуска кода игры. Границей кадра считается
+    # display.flip/update. Запись: события из event.get/poll/wait и состояние
+    # клавиатуры и мыши по кадрам. Воспроизведение: то же самое выдается игре
+    # из записи, а время каждого кадра сохраняется в отчет
+    def __init__(self, mode, options):
+        self.mode = mode
+        self.options = options
+        self.seed = options.get('seed', DEFAULT_SEED)
+        self.fps = options.get('fps', DEFAULT_FPS)
+        self.frame = 0
+        self.idle = 0.0
+        self.frame_start = None
+        self.times = []
+        self.first_frame = None
+        self.finished = False
+        self.original = {}
+        self.events = {}
+        self.state = {}
+        self.queue = []
+        self.current_state = {}
+        self.max_frames = None
+        if mode == 'replay':
+            recording = self.load_recording(options.get('recording'))
+            self.events = recording.get('events', {})
+            self.state = recording.get('state', {})
+            self.max_frames = options.get('frames') or recording.get('frames') or DEFAULT_FRAMES
+
+    @staticmethod
+    def load_recording(path):
+        if not path:
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def install(self):
+        random.seed(self.seed)
+        if self.mode == 'replay':
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+        patches = {
+            'event.get': (pygame.event, 'get', self.event_get),
+            'event.poll': (pygame.event, 'poll', self.event_poll),
+            'event.wait': (pygame.event, 'wait', self.event_wait),
+            'key.get_pressed': (pygame.key, 'get_pressed', self.state_reader('key.get_pressed', encode_keys, decode_keys)),
+            'key.get_mods': (pygame.key, 'get_mods', self.state_reader('key.get_mods')),
+            'mouse.get_pos': (pygame.mouse, 'get_pos', self.state_reader('mouse.get_pos', list, tuple)),
+            'mouse.get_pressed': (pygame.mouse, 'get_pressed', self.state_reader('mouse.get_pressed', list, tuple)),
+            'time.get_ticks': (pygame.time, 'get_ticks', self.get_ticks),
+            'Clock': (pygame.time, 'Clock', lambda: HarnessClock(self)),
+            'display.flip': (pygame.display, 'flip', self.flip),
+            'display.update': (pygame.display, 'update', self.update),
+        }
+        for name, (module, attr, replacement) in patches.items():
+            self.original[name] = getattr(module, attr)
+            setattr(module, attr, replacement)
+
+        self.begin_frame()
+        if self.mode == 'record':
+            # Запись обычно прерывает таймаут, поэтому она периодически сохраняется
+            threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    # Кадры
+
+    def begin_frame(self):
+        self.idle = 0.0
+        self.frame_start = time.perf_counter()
+        if self.mode == 'replay':
+            key = str(self.frame)
+            self.queue.extend(decode_event(entry) for entry in self.events.get(key, ()))
+            self.current_state.update(self.state.get(key, {}))
+
+    def end_frame(self):
+        elapsed = time.perf_counter() - self.frame_start - self.idle
+        # Первый кадр включает инициализацию игры и в сводку не входит
+        if self.first_frame is None:
+            self.first_frame = elapsed
+        else:
+            self.times.append(elapsed)
+        self.frame += 1
+        if self.max_frames is not None and self.frame >= self.max_frames:
+            self.finish()
+            raise SystemExit(0)
+        self.begin_frame()
+
+    def flip(self):
+        self.original['display.flip']()
+        self.end_frame()
+
+    def update(self, *args, **kwargs):
+        self.original['display.update'](*args, **kwargs)
+        self.end_frame()
+
+    def get_ticks(self):
+        return int(self.frame * 1000 / self.fps)
+
+    # События
+
+    def record_events(self, events):
+        if events:
+            self.events.setdefault(str(self.frame), []).extend(encode_event(event) for event in events)
+        return events
+
+    def take_events(self, eventtype=None, exclude=None):
+        def wanted(event):
+            if eventtype is not None:
+                types = eventtype if isinstance(eventtype, (list, tuple)) else (eventtype,)
+                if event.type not in types:
+                    return False
+            if exclude is not None:
+                types = exclude if isinstance(exclude, (list, tuple)) else (exclude,)
+                if event.type in types:
+                    return False
+            return True
+
+        taken = [event for event in self.queue if wanted(event)]
+        self.queue = [event for event in self.queue if not wanted(event)]
+        return taken
+
+    def event_get(self, eventtype=None, pump=True, exclude=None):
+        if self.mode == 'record':
+            return self.record_events(self.original['event.get'](eventtype, pump, exclude))
+        # Очередь dummy-драйвера разбираем, чтобы она не переполнялась
+        self.original['event.get']()
+        return self.take_events(eventtype, exclude)
+
+    def event_poll(self):
+        if self.mode == 'record':
+            event = self.original['event.poll']()
+            if event.type != pygame.NOEVENT:
+                self.record_events([event])
+            return event
+        if self.queue:
+            return self.queue.pop(0)
+        return pygame.event.Event(pygame.NOEVENT)
+
+    def event_wait(self, timeout=0):
+        if self.mode == 'record':
+            event = self.original['event.wait'](timeout) if timeout else self.original['event.wait']()
+            if event.type != pygame.NOEVENT:
+                self.record_events([event])
+            return event
+        return self.event_poll()
+
+    def state_reader(self, name, encode=lambda value: value, decode=lambda value: value):
+        # Запоминается первое значение за кадр - то, что увидела логика игры
+        def read(*args):
+            if self.mode == 'record':
+                value = self.original[name](*args)
+                frame_state = self.state.setdefault(str(self.frame), {})
+                if name not in frame_state:
+                    encoded = encode(value)
+                    if self.current_state.get(name) != encoded:
+                        frame_state[name] = self.current_state[name] = encoded
+                if not frame_state:
+                    del self.state[str(self.frame)]
+                return value
+            if name in self.current_state:
+                return decode(self.current_state[name])
+            return self.original[name](*args)
+        return read
+
+    # Результаты
+
+    def recording(self):
+        return {
+            'seed': self.seed,
+            'fps': self.fps,
+            'frames': self.frame,
+            'events': {key: list(value) for key, value in list(self.events.items())},
+            'state': {key: dict(value) for key, value in list(self.state.items())},
+        }
+
+    def report(self):
+        stats = frame_stats(self.times)
+        stats['first_frame_ms'] = (self.first_frame or 0) * 1000
+        return {'seed': self.seed, 'fps': self.fps, 'stats': stats,
+                'frame_ms': [round(t * 1000, 4) for t in self.times]}
+
+    def write(self):
+        if self.mode == 'record':
+            path, data = self.options['recording'], self.recording()
+        else:
+            path, data = self.options['report'], self.report()
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def flush_loop(self):
+        while not self.finished:
+            time.sleep(FLUSH_INTERVAL)
+            if not self.finished:
+                self.write()
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.write()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record game input and replay it headless for frame timing")
+    parser.add_argument('mode', choices=('record', 'replay'))
+    parser.add_argument('script', nargs='?', help="game script (default: the editor's template with --template)")
+    parser.add_argument('--template', action='store_true', help="use the editor's default game template")
+    parser.add_argument('--input', help="recording file written by 'record' and read by 'replay'")
+    parser.add_argument('--frames', type=int, help=f"frames to replay (default: recorded count or {DEFAULT_FRAMES})")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', help="write replay timings as JSON to this file")
+    parser.add_argument('--baseline', help="compare against a report stored by --output")
+    args = parser.parse_args()
+
+    if args.template:
+        code, filename = DEFAULT_TEMPLATE, '<template>'
+    elif args.script:
+        with open(args.script, encoding='utf-8') as f:
+            code, filename = f.read(), os.path.abspath(args.script)
+    else:
+        parser.error("a script or --template is required")
+    if args.mode == 'record' and not args.input:
+        parser.error("record needs --input to write the recording to")
+
+    from worker_pool import WorkerPool
+    options = {'seed': args.seed, 'fps': args.fps, 'recording': args.input and os.path.abspath(args.input)}
+    fd, report_path = tempfile.mkstemp(prefix='game-replay-', suffix='.json')
+    os.close(fd)
+    if args.mode == 'replay':
+        options['frames'] = args.frames
+        options['report'] = report_path
+    header = {'filename': filename, args.mode: options}
+    if os.path.exists(filename):
+        header['cwd'] = os.path.dirname(filename)
+
+    pool = WorkerPool(size=1)
+    try:
+        result = pool.run(code, timeout=args.timeout, header=header)
+    finally:
+        pool.shutdown()
+    sys.stdout.write(result.stdout)
+    sys.stderr.write(result.stderr)
+    if args.mode == 'record':
+        recording = read_json(args.input)
+        print(f"Recorded {recording['frames'] if recording else 0} frames to {args.input}")
+        return 0
+
+    report = read_json(report_path)
+    discard_report(report_path)
+    if report is None:
+        print("Replay produced no report", file=sys.stderr)
+        return 1
+    baseline = read_json(args.baseline) if args.baseline else None
+    print(format_stats(report['stats'], baseline and baseline['stats']))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
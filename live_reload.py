@@ -0,0 +1,126 @@
+import ast
+import sys
+import queue
+import types
+import linecache
+import threading
+import traceback
+
+import pygame
+
+
+def top_level_defs(tree):
+    # {имя: (узел, ключ сравнения)} для функций верхнего уровня и список
+    # ключей остальных инструкций модуля. ast.dump не включает номера строк,
+    # поэтому они добавлены в ключ отдельно: сдвинутая функция тоже
+    # перекомпилируется, чтобы трассировки указывали на верные строки
+    functions = {}
+    other = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = (node, (ast.dump(node), node.lineno))
+        else:
+            other.append(ast.dump(node))
+    return functions, other
+
+
+class LiveSession:
+    # Живая сессия: игра продолжает работать, а новые версии кода приходят
+    # через stdin воркера. Разбор и сравнение идут в фоновом потоке, а замена
+    # функций - в главном потоке на границе кадра (display.flip/update).
+    # Меняется __code__ существующих объектов функций, поэтому ссылки на них
+    # и все глобальные переменные игры сохраняются. Изменения вне функций
+    # верхнего уровня (главный цикл, классы, константы) требуют перезапуска
+    def __init__(self, namespace, filename, source, read_message):
+        self.namespace = namespace
+        self.filename = filename
+        self.read_message = read_message
+        self.functions, self.other = top_level_defs(ast.parse(source, filename))
+        self.patches = queue.Queue()
+        self.original = {}
+        self.version = 1
+
+    def install(self):
+        self.original['flip'] = pygame.display.flip
+        self.original['update'] = pygame.display.update
+        pygame.display.flip = self.flip
+        pygame.display.update = self.update
+        threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def flip(self):
+        self.original['flip']()
+        self.apply_pending()
+
+    def update(self, *args, **kwargs):
+        self.original['update'](*args, **kwargs)
+        self.apply_pending()
+
+    def read_loop(self):
+        stream = sys.stdin.buffer
+        while True:
+            header, payload = self.read_message(stream)
+            if header is None:
+                return
+            source = payload.decode('utf-8')
+            try:
+                patch = self.diff(source)
+            except SyntaxError as e:
+                print(f"[live] not applied: SyntaxError: {e.msg} (line {e.lineno})", file=sys.stderr, flush=True)
+                continue
+            if patch:
+                self.patches.put(patch + (source,))
+
+    def diff(self, source):
+        # Список измененных и новых функций и признак изменений вне функций
+        functions, other = top_level_defs(ast.parse(source, self.filename))
+        changed = [node for name, (node, key) in functions.items()
+                   if name not in self.functions or self.functions[name][1] != key]
+        restart = other != self.other
+        self.functions = functions
+        self.other = other
+        if not changed and not restart:
+            return None
+        return changed, restart
+
+    def apply_pending(self):
+        while True:
+            try:
+                changed, restart, source = self.patches.get_nowait()
+            except queue.Empty:
+                return
+            # Каждая версия компилируется под своим именем со своим исходником
+            # в linecache: в трассировках и старый главный цикл, и новые
+            # функции показывают свои строки
+            self.version += 1
+            filename = f"{self.filename}@{self.version}"
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+            applied = [node.name for node in changed if self.apply(node, filename)]
+            if applied:
+                print(f"[live] updated {', '.join(applied)}", flush=True)
+            if restart:
+                print("[live] changes outside top-level functions take effect after a restart", flush=True)
+
+    def apply(self, node, filename):
+        # def выполняется отдельно с глобальными переменными игры: значения
+        # по умолчанию и декораторы вычисляются заново
+        scratch = {}
+        try:
+            code = compile(ast.Module(body=[node], type_ignores=[]), filename, 'exec')
+            exec(code, self.namespace, scratch)
+        except Exception:
+            traceback.print_exc()
+            sys.stderr.flush()
+            return False
+        new = scratch[node.name]
+        old = self.namespace.get(node.name)
+        if (not node.decorator_list and isinstance(old, types.FunctionType) and isinstance(new, types.FunctionType)
+                and old.__code__.co_freevars == new.__code__.co_freevars):
+            old.__code__ = new.__code__
+            old.__defaults__ = new.__defaults__
+            old.__kwdefaults__ = new.__kwdefaults__
+            old.__annotations__ = new.__annotations__
+            old.__doc__ = new.__doc__
+        else:
+            # Новая функция или обертка декоратора: просто переназначаем имя
+            self.namespace[node.name] = new
+        return True
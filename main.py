@@ -11,10 +11,15 @@ except ImportError as e:
 # ... ваш существующий код редактора ...
 import pygame
 import sys
+import os
 import datetime
 from pygame.locals import *
 from code_editor import CodeEditor
 from game_preview import GamePreview, Button
+from autosave import AutoSaver
+from frame_profiler import PROFILER, ProfilerOverlay
+from font_registry import FONTS
+from templates import DEFAULT_TEMPLATE
 
 # Инициализация pygame
 pygame.init()
@@ -25,6 +30,10 @@ SCREEN_HEIGHT = 800
 CODE_EDITOR_WIDTH = 600
 PREVIEW_WIDTH = 600
 FPS = 60
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "python-game-editor")
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+# Шрифты интерфейса: (имя, жирный, курсив)
+FONT_SPECS = [("consolas", False, False), ("arial", False, False), ("arial", True, False)]
 
 # Цвета
 BACKGROUND = (30, 30, 40)
@@ -32,19 +41,35 @@ TEXT_COLOR = (220, 220, 220)
 
 class PythonGameEditor:
     def __init__(self):
+        # Пути к шрифтам берутся из кэша на диске; при первом запуске системные
+        # шрифты сканируются в фоне, пока открывается окно
+        FONTS.set_cache_path(os.path.join(CACHE_DIR, "fonts.json"))
+        FONTS.warm(FONT_SPECS)
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Advanced Python Game Editor 3.14.0")
+        self.screen.fill(BACKGROUND)
+        pygame.display.flip()
         self.clock = pygame.time.Clock()
         
         # Компоненты редактора
         self.code_editor = CodeEditor(0, 50, CODE_EDITOR_WIDTH, SCREEN_HEIGHT - 100)
-        self.game_preview = GamePreview(CODE_EDITOR_WIDTH, 50, PREVIEW_WIDTH, SCREEN_HEIGHT - 100)
+        self.game_preview = GamePreview(CODE_EDITOR_WIDTH, 50, PREVIEW_WIDTH, SCREEN_HEIGHT - 100,
+                                        cache_dir=os.path.join(CACHE_DIR, "results"))
+        self.game_preview.profile_listener = self.code_editor.set_line_heat
         
         # Кнопки
         self.run_button = Button(50, SCREEN_HEIGHT - 40, 100, 30, "Run Game", self.run_code)
         self.clear_button = Button(160, SCREEN_HEIGHT - 40, 100, 30, "Clear", self.clear_code)
         self.save_button = Button(270, SCREEN_HEIGHT - 40, 100, 30, "Save", self.save_code)
         self.load_button = Button(380, SCREEN_HEIGHT - 40, 100, 30, "Load", self.load_code)
+        self.stop_button = Button(490, SCREEN_HEIGHT - 40, 100, 30, "Stop", self.stop_code)
+        self.embed_button = Button(600, SCREEN_HEIGHT - 40, 110, 30, "Embed: Off", self.toggle_embed)
+        self.profile_button = Button(720, SCREEN_HEIGHT - 40, 110, 30, "Profile Run", self.profile_code)
+        self.record_button = Button(840, SCREEN_HEIGHT - 40, 90, 30, "Record", self.record_code)
+        self.replay_button = Button(940, SCREEN_HEIGHT - 40, 90, 30, "Replay", self.replay_code)
+        self.live_button = Button(1040, SCREEN_HEIGHT - 40, 90, 30, "Live", self.live_code)
+        # Версия буфера, последней отправленная в живую сессию
+        self.live_version = None
         
         # Меню
         self.menu_buttons = [
@@ -54,167 +79,118 @@ class PythonGameEditor:
             Button(300, 10, 80, 30, "Profile")
         ]
         
-        # Стартовый код для игры
-        self.load_default_template()
+        # Сохранение в фоне и журнал правок для восстановления после сбоя
+        self.autosaver = AutoSaver(self.code_editor, os.path.join(CACHE_DIR, "untitled.py"))
+        
+        # Стартовый код для игры или файл из командной строки
+        self.current_file = None
+        if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+            self.open_file(sys.argv[1])
+        elif not self.autosaver.open():
+            self.load_default_template()
+        
+        # Профилировщик кадра: F3 - показать/скрыть, F4 - экспорт
+        self.profiler_overlay = ProfilerOverlay(PROFILER, SCREEN_WIDTH - 370, 55, 360, 240)
         
         # Состояние приложения
         self.running = True
+        self.needs_full_redraw = True
     
     def load_default_template(self):
-        template = '''import pygame
-import sys
-import math
-import random
-
-# Initialize pygame
-pygame.init()
-
-# Screen dimensions
-WIDTH, HEIGHT = 600, 400
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Python Game")
-
-# Colors
-BACKGROUND = (20, 30, 40)
-PLAYER_COLOR = (86, 156, 214)
-ENEMY_COLOR = (220, 100, 100)
-BULLET_COLOR = (255, 215, 0)
-
-# Player
-player = pygame.Rect(WIDTH//2 - 15, HEIGHT - 50, 30, 30)
-player_speed = 5
-
-# Enemies
-enemies = []
-enemy_spawn_timer = 0
-
-# Bullets
-bullets = []
-bullet_speed = 7
-
-# Game state
-score = 0
-game_over = False
-clock = pygame.time.Clock()
-
-def spawn_enemy():
-    x = random.randint(20, WIDTH - 20)
-    enemy = pygame.Rect(x, -20, 25, 25)
-    enemies.append(enemy)
-
-def draw_text(text, size, x, y, color=(255, 255, 255)):
-    font = pygame.font.SysFont(None, size)
-    text_surface = font.render(text, True, color)
-    text_rect = text_surface.get_rect(center=(x, y))
-    screen.blit(text_surface, text_rect)
-
-# Main game loop
-while not game_over:
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            game_over = True
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                # Shoot bullet
-                bullet = pygame.Rect(player.centerx - 3, player.top, 6, 15)
-                bullets.append(bullet)
-    
-    # Player movement
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_LEFT] and player.left > 0:
-        player.x -= player_speed
-    if keys[pygame.K_RIGHT] and player.right < WIDTH:
-        player.x += player_speed
+        self.code_editor.lines = DEFAULT_TEMPLATE.split('\n')
     
-    # Spawn enemies
-    enemy_spawn_timer += 1
-    if enemy_spawn_timer >= 60:  # Spawn every 60 frames
-        spawn_enemy()
-        enemy_spawn_timer = 0
-    
-    # Update bullets
-    for bullet in bullets[:]:
-        bullet.y -= bullet_speed
-        if bullet.bottom < 0:
-            bullets.remove(bullet)
-    
-    # Update enemies
-    for enemy in enemies[:]:
-        enemy.y += 2
-        if enemy.top > HEIGHT:
-            enemies.remove(enemy)
-            score += 1
-        
-        # Collision with player
-        if enemy.colliderect(player):
-            game_over = True
-        
-        # Collision with bullets
-        for bullet in bullets[:]:
-            if enemy.colliderect(bullet):
-                if enemy in enemies:
-                    enemies.remove(enemy)
-                if bullet in bullets:
-                    bullets.remove(bullet)
-                score += 5
+    def run_code(self):
+        code = self.code_editor.get_code()
+        # Shift + "Run Game" запускает код заново, минуя кэш результатов
+        bypass_cache = bool(pygame.key.get_mods() & KMOD_SHIFT)
+        self.game_preview.execute_code(code, bypass_cache=bypass_cache)
+        self.show_syntax_error()
+        return True
     
-    # Draw everything
-    screen.fill(BACKGROUND)
+    def profile_code(self):
+        # Запуск под сэмплирующим профилировщиком: тепловая карта строк
+        # в редакторе и таблица горячих функций в превью
+        self.game_preview.execute_code(self.code_editor.get_code(), profile=True)
+        self.show_syntax_error()
+        return True
     
-    # Draw player
-    pygame.draw.rect(screen, PLAYER_COLOR, player)
-    pygame.draw.rect(screen, (255, 255, 255), player, 2)
+    def record_code(self):
+        # Игра запускается в окне, ввод записывается для последующих замеров
+        self.game_preview.execute_code(self.code_editor.get_code(), harness='record')
+        self.show_syntax_error()
+        return True
     
-    # Draw enemies
-    for enemy in enemies:
-        pygame.draw.rect(screen, ENEMY_COLOR, enemy)
-        pygame.draw.rect(screen, (255, 255, 255), enemy, 2)
+    def replay_code(self):
+        # Записанный ввод воспроизводится без дисплея; время кадров
+        # сравнивается с предыдущим воспроизведением
+        self.game_preview.execute_code(self.code_editor.get_code(), harness='replay')
+        self.show_syntax_error()
+        return True
     
-    # Draw bullets
-    for bullet in bullets:
-        pygame.draw.rect(screen, BULLET_COLOR, bullet)
+    def live_code(self):
+        # Игра запускается один раз, дальше правки функций применяются на лету
+        self.game_preview.execute_code(self.code_editor.get_code(), live=True)
+        self.show_syntax_error()
+        self.live_version = self.code_editor.text_version
+        return True
     
-    # Draw score
-    draw_text(f"Score: {score}", 36, WIDTH//2, 20)
+    def update_live(self):
+        # Изменившийся буфер уходит в живую сессию в том же кадре
+        if self.game_preview.is_live() and self.code_editor.text_version != self.live_version:
+            if self.game_preview.push_live_code(self.code_editor.get_code()):
+                self.live_version = self.code_editor.text_version
     
-    # Draw controls help
-    draw_text("Use ARROWS to move, SPACE to shoot", 24, WIDTH//2, HEIGHT - 20, (200, 200, 200))
+    def show_syntax_error(self):
+        if self.game_preview.syntax_error:
+            line, col, _ = self.game_preview.syntax_error
+            self.code_editor.show_error(line, col)
     
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
-sys.exit()
-'''
-        self.code_editor.lines = template.split('\n')
+    def stop_code(self):
+        self.game_preview.cancel()
+        return True
     
-    def run_code(self):
-        code = self.code_editor.get_code()
-        self.game_preview.execute_code(code)
+    def toggle_embed(self):
+        self.game_preview.set_embed(not self.game_preview.embed)
+        self.embed_button.text = "Embed: On" if self.game_preview.embed else "Embed: Off"
+        self.embed_button.dirty = True
         return True
     
     def clear_code(self):
-        self.code_editor.lines = [""]
-        self.code_editor.cursor_pos = [0, 0]
+        self.code_editor.clear()
         return True
     
     def save_code(self):
         try:
-            filename = f"game_code_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.py"
-            with open(filename, 'w') as f:
-                f.write(self.code_editor.get_code())
-            print(f"Code saved as {filename}")
+            # Первое сохранение выбирает имя файла, дальше пишем в него же
+            if not self.current_file:
+                self.current_file = os.path.abspath(
+                    f"game_code_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.py")
+                self.update_caption()
+            self.autosaver.save(self.current_file)
+            self.game_preview.work_dir = os.path.dirname(self.current_file)
         except Exception as e:
             print(f"Error saving file: {e}")
         return True
     
+    def open_file(self, path, recover=True):
+        self.current_file = path
+        self.game_preview.work_dir = os.path.dirname(os.path.abspath(path))
+        self.autosaver.open(path, recover=recover)
+        self.update_caption()
+    
+    def update_caption(self):
+        pygame.display.set_caption(f"Advanced Python Game Editor 3.14.0 - {os.path.basename(self.current_file)}")
+    
     def load_code(self):
         try:
-            # В реальном приложении здесь был бы диалог выбора файла
-            # Для демонстрации просто загружаем шаблон
-            self.load_default_template()
-            print("Loaded default template")
+            # В реальном приложении здесь был бы диалог выбора файла.
+            # Перечитываем открытый файл, иначе загружаем шаблон
+            if self.current_file:
+                self.open_file(self.current_file, recover=False)
+                print(f"Loaded {self.current_file}")
+            else:
+                self.load_default_template()
+                print("Loaded default template")
         except Exception as e:
             print(f"Error loading file: {e}")
         return True
@@ -223,48 +199,127 @@ sys.exit()
         for event in pygame.event.get():
             if event.type == QUIT:
                 self.running = False
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                self.needs_full_redraw = True
+            elif event.type == KEYDOWN and event.key == K_F3:
+                self.profiler_overlay.toggle()
+                self.needs_full_redraw = True
+            elif event.type == KEYDOWN and event.key == K_F4:
+                self.export_profile()
             
             self.code_editor.handle_event(event)
+            self.game_preview.handle_event(event)
             self.run_button.handle_event(event)
             self.clear_button.handle_event(event)
             self.save_button.handle_event(event)
             self.load_button.handle_event(event)
+            self.stop_button.handle_event(event)
+            self.embed_button.handle_event(event)
+            self.profile_button.handle_event(event)
+            self.record_button.handle_event(event)
+            self.replay_button.handle_event(event)
+            self.live_button.handle_event(event)
             
             for button in self.menu_buttons:
                 button.handle_event(event)
     
+    def export_profile(self):
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            json_path = os.path.join(PROFILE_DIR, f"frames_{stamp}.json")
+            trace_path = os.path.join(PROFILE_DIR, f"trace_{stamp}.json")
+            PROFILER.export_json(json_path)
+            PROFILER.export_chrome_trace(trace_path)
+            print(f"Profile saved as {json_path} and {trace_path}")
+        except OSError as e:
+            print(f"Error saving profile: {e}")
+    
     def draw(self):
+        if self.needs_full_redraw:
+            self.draw_full()
+            return
+        
+        # Перерисовываем только изменившиеся компоненты
+        dirty_rects = []
+        with PROFILER.section('editor.draw'):
+            dirty_rects.extend(self.code_editor.draw_dirty(self.screen))
+        with PROFILER.section('preview.draw'):
+            dirty_rects.extend(self.game_preview.draw_dirty(self.screen))
+        for button in self.buttons():
+            dirty_rects.extend(button.draw_dirty(self.screen))
+        
+        # Оверлей рисуется поверх всего каждый кадр
+        if self.profiler_overlay.visible:
+            dirty_rects.append(self.profiler_overlay.draw(self.screen))
+        
+        if dirty_rects:
+            with PROFILER.section('display.flip'):
+                pygame.display.update(dirty_rects)
+    
+    def buttons(self):
+        return [self.run_button, self.clear_button, self.save_button, self.load_button,
+                self.stop_button, self.embed_button, self.profile_button,
+                self.record_button, self.replay_button, self.live_button] + self.menu_buttons
+    
+    def draw_full(self):
         self.screen.fill(BACKGROUND)
         
         # Рисуем компоненты
-        self.code_editor.draw(self.screen)
-        self.game_preview.draw(self.screen)
+        with PROFILER.section('editor.draw'):
+            self.code_editor.draw(self.screen)
+        with PROFILER.section('preview.draw'):
+            self.game_preview.draw(self.screen)
         
         # Рисуем кнопки
         self.run_button.draw(self.screen)
         self.clear_button.draw(self.screen)
         self.save_button.draw(self.screen)
         self.load_button.draw(self.screen)
+        self.stop_button.draw(self.screen)
+        self.embed_button.draw(self.screen)
+        self.profile_button.draw(self.screen)
+        self.record_button.draw(self.screen)
+        self.replay_button.draw(self.screen)
+        self.live_button.draw(self.screen)
         
         # Рисуем меню
         for button in self.menu_buttons:
             button.draw(self.screen)
         
         # Заголовок
-        title_font = pygame.font.SysFont("arial", 24, bold=True)
+        title_font = FONTS.get("arial", 24, bold=True)
         title = title_font.render("Advanced Python 3.14.0 Game Editor", True, TEXT_COLOR)
         self.screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 15))
         
-        pygame.display.flip()
+        if self.profiler_overlay.visible:
+            self.profiler_overlay.draw(self.screen)
+        
+        with PROFILER.section('display.flip'):
+            pygame.display.flip()
+        self.needs_full_redraw = False
     
     def run(self):
         while self.running:
             dt = self.clock.tick(FPS) / 1000.0
             
-            self.handle_events()
-            self.code_editor.update(dt)
+            PROFILER.begin_frame()
+            with PROFILER.section('handle_events'):
+                self.handle_events()
+            with PROFILER.section('editor.update'):
+                self.code_editor.update(dt)
+            with PROFILER.section('preview.update'):
+                self.game_preview.update(dt)
+                self.update_live()
+            self.autosaver.update(dt)
+            self.profiler_overlay.update(dt)
             self.draw()
+            PROFILER.end_frame()
         
+        self.autosaver.shutdown()
+        self.code_editor.shutdown()
+        self.game_preview.shutdown()
+        FONTS.save_cache()
         pygame.quit()
         sys.exit()
 
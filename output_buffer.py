@@ -0,0 +1,86 @@
+from itertools import islice
+from collections import deque
+
+MAX_LINES = 5000
+MAX_LINE_CHARS = 1000
+
+
+class OutputBuffer:
+    # Кольцевой буфер строк вывода игры. Текст из канала дописывается
+    # кусками по мере поступления; самые старые строки вытесняются, а
+    # слишком длинные строки обрезаются
+    def __init__(self, max_lines=MAX_LINES, max_line_chars=MAX_LINE_CHARS):
+        self.max_line_chars = max_line_chars
+        self.lines = deque(maxlen=max_lines)
+        self.clear()
+
+    def clear(self):
+        self.lines.clear()
+        # Сколько строк было добавлено всего, включая вытесненные
+        self.total = 0
+        # Последняя строка еще не закончилась переводом строки
+        self.open = False
+        self.has_errors = False
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def start(self):
+        # Абсолютный номер первой сохраненной строки
+        return self.total - len(self.lines)
+
+    @property
+    def end(self):
+        return self.total
+
+    def clip(self, text):
+        if len(text) > self.max_line_chars:
+            return text[:self.max_line_chars] + " …"
+        return text
+
+    def push(self, stream, text):
+        self.total += 1
+        self.lines.append([stream, self.clip(text)])
+
+    def append(self, stream, text):
+        # Кусок вывода из канала: может начинаться с продолжения незаконченной строки
+        if not text:
+            return
+        if stream == 'stderr':
+            self.has_errors = True
+        head, *rest = text.split('\n')
+        head = head.rstrip('\r')
+        if self.open and self.lines[-1][0] == stream:
+            entry = self.lines[-1]
+            entry[1] = self.clip(entry[1] + head)
+        elif head or rest:
+            self.push(stream, head)
+        self.open = bool(rest[-1] if rest else head)
+        # Пустой хвост после последнего перевода строки - не строка
+        if rest and not rest[-1]:
+            rest.pop()
+        # Строки, которые все равно будут вытеснены этим же куском, не добавляем
+        excess = len(rest) - self.lines.maxlen
+        if excess > 0:
+            del rest[:excess]
+            self.total += excess
+        for piece in rest:
+            self.push(stream, piece.rstrip('\r'))
+
+    def add_line(self, stream, text):
+        # Сообщение редактора (отмена, таймаут) всегда с новой строки
+        if stream == 'stderr':
+            self.has_errors = True
+        for line in text.split('\n'):
+            self.push(stream, line)
+        self.open = False
+
+    def window(self, end, count):
+        # Строки с абсолютными номерами [end - count, end)
+        end = max(self.start, min(end, self.end))
+        first = max(self.start, end - count)
+        return [tuple(entry) for entry in islice(self.lines, first - self.start, end - self.start)]
+
+    def text(self, stream=None):
+        return '\n'.join(text for line_stream, text in self.lines if stream is None or line_stream == stream)
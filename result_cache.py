@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import hashlib
+from collections import OrderedDict
+
+
+class ResultCache:
+    # Двухуровневый кэш результатов запуска: LRU в памяти и необязательный
+    # каталог на диске с вытеснением по суммарному размеру
+    def __init__(self, max_entries=64, disk_dir=None, max_disk_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, code, mode=''):
+        digest = hashlib.sha256()
+        digest.update(sys.version.encode('utf-8'))
+        digest.update(b'\0' + mode.encode('utf-8') + b'\0')
+        digest.update(code.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        entry = self.load(key)
+        if entry is not None:
+            self.remember(key, entry)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, stdout, stderr, returncode, elapsed):
+        entry = {
+            'stdout': stdout,
+            'stderr': stderr,
+            'returncode': returncode,
+            'elapsed': elapsed,
+        }
+        self.remember(key, entry)
+        self.store(key, entry)
+        return entry
+
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Дисковый уровень
+
+    def path(self, key):
+        return os.path.join(self.disk_dir, key + '.json')
+
+    def load(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+            # Обновляем время доступа для вытеснения давно не используемых
+            os.utime(self.path(key))
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        if not self.disk_dir:
+            return
+        try:
+            tmp_path = self.path(key) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.path(key))
+            self.evict_disk()
+        except OSError as e:
+            print(f"Error writing result cache: {e}")
+
+    def evict_disk(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            os.unlink(path)
+            total -= size
+
+    def clear(self):
+        self.entries.clear()
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith('.json'):
+                    os.unlink(os.path.join(self.disk_dir, name))
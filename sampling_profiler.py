@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import signal
+import threading
+
+SAMPLE_INTERVAL = 0.005
+FLUSH_INTERVAL = 0.5
+
+
+class SamplingProfiler:
+    # Сэмплирующий профилировщик кода игры в процессе воркера. Где есть
+    # setitimer, сэмплы снимает таймер ITIMER_PROF по процессорному времени:
+    # ожидание в clock.tick и sleep в отчет не попадает. Иначе стек главного
+    # потока снимается из отдельного потока по настенному времени.
+    # Учитываются только кадры кода пользователя (по имени файла): время
+    # внутри pygame достается строке, которая его вызвала
+    def __init__(self, path, filename, interval=SAMPLE_INTERVAL):
+        self.path = path
+        self.filename = filename
+        self.interval = interval
+        self.lines = {}
+        self.self_counts = {}
+        self.total_counts = {}
+        self.samples = 0
+        self.mode = None
+        self.running = False
+        self.started_at = None
+        self.thread_id = None
+        self.previous_handler = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.running = True
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            self.mode = 'cpu'
+            self.previous_handler = signal.signal(signal.SIGPROF, self.on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.mode = 'wall'
+            threading.Thread(target=self.sample_loop, daemon=True).start()
+        # Игру обычно останавливает таймаут (SIGKILL), поэтому отчет
+        # периодически перезаписывается, а не только при выходе
+        threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.mode == 'cpu':
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+        self.write()
+
+    def on_signal(self, signum, frame):
+        self.record(frame)
+
+    def sample_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.record(frame)
+
+    def flush_loop(self):
+        while self.running:
+            time.sleep(FLUSH_INTERVAL)
+            if self.running:
+                self.write()
+
+    def record(self, frame):
+        self.samples += 1
+        seen = set()
+        innermost = True
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == self.filename:
+                key = (code.co_name, code.co_firstlineno)
+                if innermost:
+                    # Собственное время: ближайший к вершине стека кадр пользователя
+                    lineno = frame.f_lineno
+                    self.lines[lineno] = self.lines.get(lineno, 0) + 1
+                    self.self_counts[key] = self.self_counts.get(key, 0) + 1
+                    innermost = False
+                # Рекурсивная функция считается в сэмпле один раз
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] = self.total_counts.get(key, 0) + 1
+            frame = frame.f_back
+
+    def report(self):
+        # Копии словарей снимаются целиком, пока таймер может их менять
+        lines = dict(self.lines)
+        self_counts = dict(self.self_counts)
+        total_counts = dict(self.total_counts)
+        functions = [[name, first_line, self_counts.get((name, first_line), 0), total]
+                     for (name, first_line), total in total_counts.items()]
+        return {
+            'mode': self.mode,
+            'interval': self.interval,
+            'duration': time.perf_counter() - self.started_at,
+            'samples': self.samples,
+            'lines': {str(lineno): count for lineno, count in lines.items()},
+            'functions': functions,
+        }
+
+    def write(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def read_report(path):
+    # Отчет последнего сброса или None, если профилировщик не успел его записать
+    try:
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    report['lines'] = {int(lineno): count for lineno, count in report['lines'].items()}
+    return report
@@ -0,0 +1,276 @@
+import re
+import time
+from bisect import bisect_left, bisect_right
+
+import pygame
+from pygame.locals import *
+
+SCAN_BUDGET = 0.002
+
+
+class SearchIndex:
+    # Совпадения ищутся построчно и кэшируются по тексту строки: после правки
+    # заново проверяются только измененные строки. Подсчет совпадений по всему
+    # документу идет фоном по кадрам с ограничением по времени
+    def __init__(self):
+        self.query = ""
+        self.regex = False
+        self.pattern = None
+        self.error = None
+        self.cache = {}
+        self.invalidate()
+
+    def set_query(self, query, regex=False):
+        if query == self.query and regex == self.regex:
+            return
+        self.query = query
+        self.regex = regex
+        self.cache = {}
+        self.error = None
+        self.pattern = None
+        if query:
+            try:
+                self.pattern = re.compile(query if regex else re.escape(query))
+            except re.error as e:
+                self.error = str(e)
+        self.invalidate()
+
+    def invalidate(self):
+        # Номера строк могли сдвинуться: пересчитываем сводку заново,
+        # строки с неизменным текстом берутся из кэша
+        self.scan_row = 0
+        self.rows = []
+        self.totals = []
+        self.count = 0
+        self.complete = self.pattern is None
+
+    def matches(self, line):
+        if self.pattern is None:
+            return ()
+        found = self.cache.get(line)
+        if found is None:
+            # Кортежи из чисел сборщик мусора перестает отслеживать,
+            # а строки без совпадений делят один пустой кортеж
+            found = self.cache[line] = tuple(m.span() for m in self.pattern.finditer(line))
+        return found
+
+    def scan(self, lines, budget=SCAN_BUDGET):
+        # Продолжает подсчет совпадений; возвращает True, если сводка изменилась
+        if self.complete:
+            return False
+        if len(self.cache) > 2 * len(lines) + 1024:
+            self.cache = {}
+        deadline = time.perf_counter() + budget
+        row = self.scan_row
+        total = len(lines)
+        while row < total:
+            found = self.matches(lines[row])
+            if found:
+                self.count += len(found)
+                self.rows.append(row)
+                self.totals.append(self.count)
+            row += 1
+            if not row % 256 and time.perf_counter() > deadline:
+                break
+        self.scan_row = row
+        self.complete = row >= total
+        return True
+
+    def index_of(self, lines, row, start):
+        # Порядковый номер совпадения (с 1) по готовой сводке
+        if not self.complete:
+            return None
+        i = bisect_left(self.rows, row)
+        if i == len(self.rows) or self.rows[i] != row:
+            return None
+        before = self.totals[i - 1] if i else 0
+        for j, (match_start, _) in enumerate(self.matches(lines[row])):
+            if match_start == start:
+                return before + j + 1
+        return None
+
+    def find(self, lines, row, col, backwards=False, strict=False, limit=None):
+        # Ближайшее совпадение, начинающееся не раньше (row, col), или
+        # последнее, начинающееся раньше него, по кругу. strict пропускает
+        # пустое совпадение в самой позиции. Когда сводка готова, строки без
+        # совпадений пропускаются по bisect. limit ограничивает число строк,
+        # просматриваемых до готовности сводки
+        if self.pattern is None:
+            return None
+        total = len(lines)
+        steps = total + 1
+        if limit is not None and not self.complete:
+            steps = min(steps, limit)
+        for step in range(steps):
+            if self.complete and step:
+                row = self.next_row(row, backwards)
+                if row is None:
+                    return None
+            elif step:
+                row = (row - 1) % total if backwards else (row + 1) % total
+            found = self.matches(lines[row])
+            if backwards:
+                for start, end in reversed(found):
+                    if step or start < col:
+                        return row, start, end
+            else:
+                for start, end in found:
+                    if step or start > col or (start == col and not strict):
+                        return row, start, end
+        return None
+
+    def next_row(self, row, backwards):
+        if not self.rows:
+            return None
+        if backwards:
+            i = bisect_left(self.rows, row) - 1
+            return self.rows[i]
+        i = bisect_right(self.rows, row)
+        return self.rows[i % len(self.rows)]
+
+    def replace_line(self, line, replacement):
+        if self.regex:
+            return self.pattern.sub(replacement, line)
+        return line.replace(self.query, replacement)
+
+    def replace_all(self, lines, replacement):
+        # Новые тексты строк с совпадениями {row: text} и число замен
+        changes = {}
+        count = 0
+        if self.pattern is None:
+            return changes, count
+        for row, line in enumerate(lines):
+            found = self.matches(line)
+            if found:
+                text = self.replace_line(line, replacement)
+                if '\n' in text:
+                    raise re.error("replacement must not contain line breaks")
+                changes[row] = text
+                count += len(found)
+        return changes, count
+
+
+class FindBar:
+    # Панель поиска внизу редактора. Ctrl+F - поиск, Ctrl+H - замена,
+    # Enter / Shift+Enter - следующее / предыдущее совпадение, Tab - переход
+    # между полями, Ctrl+Enter - заменить все, Ctrl+R - регулярные выражения,
+    # Esc - закрыть
+    def __init__(self, editor):
+        self.editor = editor
+        self.active = False
+        self.replace_mode = False
+        self.field = 'find'
+        self.query = ""
+        self.replacement = ""
+        self.regex = False
+        self.message = None
+        self.background = (40, 40, 55)
+        self.field_color = (25, 25, 35)
+        self.text_color = (220, 220, 220)
+        self.dim_color = (128, 128, 128)
+
+    def open(self, replace=False):
+        self.active = True
+        self.replace_mode = replace
+        self.field = 'replace' if replace and self.query else 'find'
+        self.message = None
+        self.update_query()
+
+    def close(self):
+        self.active = False
+        self.editor.search.set_query("")
+
+    def update_query(self):
+        self.editor.search.set_query(self.query, self.regex)
+
+    def handle_key(self, event):
+        ctrl = event.mod & KMOD_CTRL
+        self.message = None
+        if event.key == K_ESCAPE:
+            self.close()
+        elif event.key == K_RETURN and ctrl:
+            if self.replace_mode:
+                self.editor.replace_all(self.replacement)
+        elif event.key == K_RETURN:
+            self.editor.find_next(backwards=bool(event.mod & KMOD_SHIFT))
+        elif event.key == K_TAB:
+            if self.replace_mode:
+                self.field = 'replace' if self.field == 'find' else 'find'
+        elif ctrl and event.key == K_r:
+            self.regex = not self.regex
+            self.update_query()
+        elif ctrl and event.key in (K_f, K_h):
+            self.open(replace=event.key == K_h)
+        elif ctrl:
+            # Остальные сочетания (отмена и т.п.) обрабатывает редактор
+            return False
+        elif event.key == K_BACKSPACE:
+            self.edit_field(lambda text: text[:-1])
+        elif event.unicode and event.unicode.isprintable():
+            self.edit_field(lambda text: text + event.unicode)
+        return True
+
+    def edit_field(self, change):
+        if self.field == 'replace':
+            self.replacement = change(self.replacement)
+            return
+        self.query = change(self.query)
+        self.update_query()
+        # Поиск по мере набора: переходим к первому совпадению от курсора
+        self.editor.find_next(from_cursor=True)
+
+    def height(self):
+        rows = 2 if self.replace_mode else 1
+        return rows * (self.editor.line_height + 6) + 6
+
+    def get_rect(self):
+        rect = self.editor.rect
+        return pygame.Rect(rect.left, rect.bottom - self.height(), rect.width, self.height())
+
+    def status(self):
+        search = self.editor.search
+        if self.message:
+            return self.message
+        if search.error:
+            return "Invalid pattern"
+        if not self.query:
+            return ""
+        if not search.complete:
+            return f"{search.count}+ ..."
+        if not search.count:
+            return "No matches"
+        current = self.editor.current_match
+        index = current and search.index_of(self.editor.lines, current[0], current[1])
+        if index:
+            return f"{index} of {search.count}"
+        return f"{search.count} matches"
+
+    def draw(self, screen):
+        rect = self.get_rect()
+        pygame.draw.rect(screen, self.background, rect)
+        render = self.editor.glyph_cache.render
+        row_height = self.editor.line_height + 6
+        fields = [('find', "Find", self.query)]
+        if self.replace_mode:
+            fields.append(('replace', "Repl", self.replacement))
+
+        for i, (name, label, text) in enumerate(fields):
+            y = rect.top + 6 + i * row_height
+            screen.blit(render(label, self.dim_color), (rect.left + 6, y + 2))
+            field_rect = pygame.Rect(rect.left + 50, y, rect.width - 190, row_height - 4)
+            pygame.draw.rect(screen, self.field_color, field_rect)
+            if name == self.field:
+                pygame.draw.rect(screen, (86, 156, 214), field_rect, 1)
+            screen.set_clip(field_rect.inflate(-6, 0))
+            # Длинный запрос прокручивается так, чтобы был виден его конец
+            text_x = field_rect.left + 4
+            width = self.editor.metrics.text_width(text)
+            if width > field_rect.width - 10:
+                text_x -= width - (field_rect.width - 10)
+            if text:
+                screen.blit(render(text, self.text_color), (text_x, y + 2))
+            screen.set_clip(None)
+
+        flags = ".* " if self.regex else ""
+        status = render(flags + self.status() or " ", self.dim_color)
+        screen.blit(status, (rect.right - 134, rect.top + 8))
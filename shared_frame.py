@@ -0,0 +1,102 @@
+import os
+import struct
+from multiprocessing import shared_memory
+
+import pygame
+
+# Заголовок: номер кадра (нечетный, пока кадр пишется), ширина, высота
+HEADER = struct.Struct('<QII')
+FRAME_FORMAT = 'RGBX'
+
+
+def attach_shared_memory(name):
+    # Дочерний процесс не должен удалять чужой сегмент при выходе
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedFrameBuffer:
+    def __init__(self, name=None, max_size=(1280, 1024)):
+        self.max_size = tuple(max_size)
+        self.owner = name is None
+        if self.owner:
+            size = HEADER.size + self.max_size[0] * self.max_size[1] * 4
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = attach_shared_memory(name)
+        self.sequence = 0
+        self.last_sequence = 0
+        self.view_surface = None
+        self.view_size = None
+        self.scaled_surface = None
+        if self.owner:
+            self.reset()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def reset(self):
+        HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+        self.sequence = 0
+        self.last_sequence = 0
+
+    def frame_view(self, size):
+        # Поверхность pygame поверх общей памяти, пиксели не копируются
+        if self.view_size != size:
+            self.view_surface = None
+            width, height = size
+            pixels = self.shm.buf[HEADER.size:HEADER.size + width * height * 4]
+            self.view_surface = pygame.image.frombuffer(pixels, size, FRAME_FORMAT)
+            self.view_size = size
+        return self.view_surface
+
+    def write(self, surface):
+        width = min(surface.get_width(), self.max_size[0])
+        height = min(surface.get_height(), self.max_size[1])
+        self.sequence += 1
+        HEADER.pack_into(self.shm.buf, 0, self.sequence, width, height)
+        self.frame_view((width, height)).blit(surface, (0, 0))
+        self.sequence += 1
+        HEADER.pack_into(self.shm.buf, 0, self.sequence, width, height)
+
+    def read_into(self, target):
+        sequence, width, height = HEADER.unpack_from(self.shm.buf, 0)
+        if sequence == self.last_sequence or sequence % 2 or not width or not height:
+            return False
+
+        # Масштабируем кадр в target с сохранением пропорций
+        frame = self.frame_view((width, height))
+        target.fill((0, 0, 0))
+        scale = min(target.get_width() / width, target.get_height() / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        dest = target.subsurface(pygame.Rect((0, 0), size).move(
+            (target.get_width() - size[0]) // 2, (target.get_height() - size[1]) // 2))
+        if size == (width, height):
+            dest.blit(frame, (0, 0))
+        else:
+            # transform.scale не конвертирует формат пикселей, поэтому масштабируем
+            # в поверхность того же формата, что и кадр
+            if self.scaled_surface is None or self.scaled_surface.get_size() != size:
+                self.scaled_surface = pygame.Surface(size, 0, frame)
+            pygame.transform.scale(frame, size, self.scaled_surface)
+            dest.blit(self.scaled_surface, (0, 0))
+
+        # Кадр перезаписали во время чтения: покажем следующий
+        if HEADER.unpack_from(self.shm.buf, 0)[0] != sequence:
+            return False
+        self.last_sequence = sequence
+        return True
+
+    def close(self):
+        self.view_surface = None
+        self.scaled_surface = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,218 @@
+import time
+from bisect import bisect_left
+
+NORMAL = None
+STRING_PREFIXES = {'r', 'b', 'f', 'u', 'rb', 'br', 'fr', 'rf'}
+
+
+class IncrementalLexer:
+    def __init__(self, keywords, types):
+        self.keywords = keywords
+        self.types = types
+        # Кэш по строкам: токены, состояние на входе и на выходе строки
+        self.tokens = []
+        self.start_states = []
+        self.end_states = []
+        # Строки до clean_upto уже лексировались; из них перепроверить нужно
+        # только строки из dirty (отсортированный список начал измененных мест)
+        self.clean_upto = 0
+        self.dirty = []
+        self.lexed_lines = 0
+
+    def reset(self, line_count):
+        self.tokens = [None] * line_count
+        self.start_states = [NORMAL] * line_count
+        self.end_states = [NORMAL] * line_count
+        self.clean_upto = 0
+        self.dirty = []
+
+    def mark_dirty(self, row):
+        if row < self.clean_upto:
+            i = bisect_left(self.dirty, row)
+            if i == len(self.dirty) or self.dirty[i] != row:
+                self.dirty.insert(i, row)
+
+    def invalidate(self, row):
+        self.tokens[row] = None
+        self.mark_dirty(row)
+
+    def insert_lines(self, row, count):
+        self.tokens[row:row] = [None] * count
+        self.start_states[row:row] = [NORMAL] * count
+        self.end_states[row:row] = [NORMAL] * count
+        i = bisect_left(self.dirty, row)
+        self.dirty[i:] = [d + count for d in self.dirty[i:]]
+        if row < self.clean_upto:
+            self.clean_upto += count
+        # Новые строки без токенов перелексируются вслед за первой из них
+        self.mark_dirty(row)
+
+    def delete_lines(self, row, count):
+        del self.tokens[row:row + count]
+        del self.start_states[row:row + count]
+        del self.end_states[row:row + count]
+        i = bisect_left(self.dirty, row)
+        j = bisect_left(self.dirty, row + count)
+        self.dirty[i:] = [d - count for d in self.dirty[j:]]
+        if row < self.clean_upto:
+            self.clean_upto = max(row, self.clean_upto - count)
+        # У строки после удаленных могло измениться состояние на входе
+        if row < len(self.tokens):
+            self.mark_dirty(row)
+
+    def relex_from(self, j, lines, deadline):
+        # Перелексирует строки с j, пока состояние на выходе не совпадет с
+        # сохраненным: дальше кэш верен, и проход возвращается к следующему
+        # измененному месту, а не идет строка за строкой до области просмотра.
+        # По истечении deadline остаток снова помечается измененным
+        while j < self.clean_upto:
+            state = self.end_states[j - 1] if j else NORMAL
+            if self.tokens[j] is not None and self.start_states[j] == state:
+                return True
+            if not j % 256 and time.perf_counter() > deadline:
+                self.mark_dirty(j)
+                return False
+            self.tokens[j], self.end_states[j] = self.lex_line(lines[j], state)
+            self.start_states[j] = state
+            self.lexed_lines += 1
+            j += 1
+        return True
+
+    def is_exact(self, row):
+        return row < self.clean_upto and (not self.dirty or self.dirty[0] > row)
+
+    def catch_up(self, row, lines, deadline):
+        # Точное лексирование до row включительно, пока не истек deadline.
+        # Возвращает True, когда состояния до row известны точно. Большой файл
+        # так лексируется по кусочку за кадр, а не целиком в одном кадре
+        while self.dirty and self.dirty[0] <= row:
+            if not self.relex_from(self.dirty.pop(0), lines, deadline):
+                return False
+        while self.clean_upto <= row:
+            j = self.clean_upto
+            if not j % 256 and time.perf_counter() > deadline:
+                return False
+            state = self.end_states[j - 1] if j else NORMAL
+            self.tokens[j], self.end_states[j] = self.lex_line(lines[j], state)
+            self.start_states[j] = state
+            self.lexed_lines += 1
+            self.clean_upto += 1
+        return True
+
+    def view_states(self, first, last, lines):
+        # Состояния на входе строк [first, last) для отрисовки: точные там, куда
+        # лексер уже дошел, а дальше предварительные - от последнего известного
+        # состояния (или обычного кода) внутри области просмотра
+        states = []
+        state = NORMAL
+        for row in range(first, last):
+            if self.is_exact(row):
+                states.append(self.start_states[row])
+                state = self.end_states[row]
+            else:
+                if row == first and self.tokens[row] is not None:
+                    state = self.start_states[row]
+                states.append(state)
+                state = self.lex_line(lines[row], state)[1]
+        return states
+
+    def tokens_for(self, row, lines, state):
+        # Токены строки при заданном состоянии на входе (точном или предварительном)
+        if self.is_exact(row) and self.start_states[row] == state:
+            return self.tokens[row]
+        return self.lex_line(lines[row], state)[0]
+
+    def lex_line(self, line, state=NORMAL):
+        tokens = []
+        i = 0
+        n = len(line)
+
+        # Продолжение строки, начатой на предыдущих строках
+        if state is not NORMAL:
+            end, continued = self.find_string_end(line, 0, state)
+            if end is None:
+                if line:
+                    tokens.append(('string', line))
+                if len(state) == 3 or continued:
+                    return tokens, state
+                return tokens, NORMAL
+            tokens.append(('string', line[:end]))
+            i = end
+
+        while i < n:
+            char = line[i]
+
+            # Комментарии
+            if char == '#':
+                tokens.append(('comment', line[i:]))
+                break
+
+            # Строки
+            elif char in ('"', "'"):
+                i, state = self.lex_string(line, i, i, tokens)
+                if state is not NORMAL:
+                    return tokens, state
+                continue
+
+            # Числа
+            elif char.isdigit():
+                j = i
+                while j < n and (line[j].isdigit() or line[j] == '.'):
+                    j += 1
+                tokens.append(('number', line[i:j]))
+                i = j
+                continue
+
+            # Идентификаторы и ключевые слова
+            elif char.isalpha() or char == '_':
+                j = i
+                while j < n and (line[j].isalnum() or line[j] == '_'):
+                    j += 1
+                word = line[i:j]
+                if j < n and line[j] in ('"', "'") and word.lower() in STRING_PREFIXES:
+                    i, state = self.lex_string(line, i, j, tokens)
+                    if state is not NORMAL:
+                        return tokens, state
+                    continue
+                if word in self.keywords:
+                    tokens.append(('keyword', word))
+                elif word in self.types:
+                    tokens.append(('type', word))
+                else:
+                    tokens.append(('normal', word))
+                i = j
+                continue
+
+            # Прочие символы
+            else:
+                tokens.append(('normal', char))
+                i += 1
+
+        return tokens, NORMAL
+
+    def lex_string(self, line, start, quote_pos, tokens):
+        quote = line[quote_pos]
+        if line.startswith(quote * 3, quote_pos):
+            quote = quote * 3
+
+        end, continued = self.find_string_end(line, quote_pos + len(quote), quote)
+        if end is None:
+            tokens.append(('string', line[start:]))
+            # Тройные кавычки и строка с "\" в конце продолжаются на следующей строке
+            if len(quote) == 3 or continued:
+                return len(line), quote
+            return len(line), NORMAL
+
+        tokens.append(('string', line[start:end]))
+        return end, NORMAL
+
+    def find_string_end(self, line, i, quote):
+        n = len(line)
+        while i < n:
+            if line[i] == '\\':
+                i += 2
+                continue
+            if line.startswith(quote, i):
+                return i + len(quote), False
+            i += 1
+        return None, i > n
@@ -0,0 +1,127 @@
+# Стартовый код игры
+DEFAULT_TEMPLATE = '''import pygame
+import sys
+import math
+import random
+
+# Initialize pygame
+pygame.init()
+
+# Screen dimensions
+WIDTH, HEIGHT = 600, 400
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+pygame.display.set_caption("Python Game")
+
+# Colors
+BACKGROUND = (20, 30, 40)
+PLAYER_COLOR = (86, 156, 214)
+ENEMY_COLOR = (220, 100, 100)
+BULLET_COLOR = (255, 215, 0)
+
+# Player
+player = pygame.Rect(WIDTH//2 - 15, HEIGHT - 50, 30, 30)
+player_speed = 5
+
+# Enemies
+enemies = []
+enemy_spawn_timer = 0
+
+# Bullets
+bullets = []
+bullet_speed = 7
+
+# Game state
+score = 0
+game_over = False
+clock = pygame.time.Clock()
+
+def spawn_enemy():
+    x = random.randint(20, WIDTH - 20)
+    enemy = pygame.Rect(x, -20, 25, 25)
+    enemies.append(enemy)
+
+def draw_text(text, size, x, y, color=(255, 255, 255)):
+    font = pygame.font.SysFont(None, size)
+    text_surface = font.render(text, True, color)
+    text_rect = text_surface.get_rect(center=(x, y))
+    screen.blit(text_surface, text_rect)
+
+# Main game loop
+while not game_over:
+    # Handle events
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            game_over = True
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_SPACE:
+                # Shoot bullet
+                bullet = pygame.Rect(player.centerx - 3, player.top, 6, 15)
+                bullets.append(bullet)
+    
+    # Player movement
+    keys = pygame.key.get_pressed()
+    if keys[pygame.K_LEFT] and player.left > 0:
+        player.x -= player_speed
+    if keys[pygame.K_RIGHT] and player.right < WIDTH:
+        player.x += player_speed
+    
+    # Spawn enemies
+    enemy_spawn_timer += 1
+    if enemy_spawn_timer >= 60:  # Spawn every 60 frames
+        spawn_enemy()
+        enemy_spawn_timer = 0
+    
+    # Update bullets
+    for bullet in bullets[:]:
+        bullet.y -= bullet_speed
+        if bullet.bottom < 0:
+            bullets.remove(bullet)
+    
+    # Update enemies
+    for enemy in enemies[:]:
+        enemy.y += 2
+        if enemy.top > HEIGHT:
+            enemies.remove(enemy)
+            score += 1
+        
+        # Collision with player
+        if enemy.colliderect(player):
+            game_over = True
+        
+        # Collision with bullets
+        for bullet in bullets[:]:
+            if enemy.colliderect(bullet):
+                if enemy in enemies:
+                    enemies.remove(enemy)
+                if bullet in bullets:
+                    bullets.remove(bullet)
+                score += 5
+    
+    # Draw everything
+    screen.fill(BACKGROUND)
+    
+    # Draw player
+    pygame.draw.rect(screen, PLAYER_COLOR, player)
+    pygame.draw.rect(screen, (255, 255, 255), player, 2)
+    
+    # Draw enemies
+    for enemy in enemies:
+        pygame.draw.rect(screen, ENEMY_COLOR, enemy)
+        pygame.draw.rect(screen, (255, 255, 255), enemy, 2)
+    
+    # Draw bullets
+    for bullet in bullets:
+        pygame.draw.rect(screen, BULLET_COLOR, bullet)
+    
+    # Draw score
+    draw_text(f"Score: {score}", 36, WIDTH//2, 20)
+    
+    # Draw controls help
+    draw_text("Use ARROWS to move, SPACE to shoot", 24, WIDTH//2, HEIGHT - 20, (200, 200, 200))
+    
+    pygame.display.flip()
+    clock.tick(60)
+
+pygame.quit()
+sys.exit()
+'''
@@ -0,0 +1,44 @@
+from output_buffer import OutputBuffer
+
+
+def texts(buffer):
+    return [text for stream, text in buffer.window(buffer.end, len(buffer))]
+
+
+def test_chunk_longer_than_ring_keeps_last_lines():
+    buffer = OutputBuffer(max_lines=3)
+    buffer.append('stdout', "1\n2\n3\n4\n5\n6\n")
+    assert texts(buffer) == ['4', '5', '6']
+    assert buffer.start == 3
+    assert buffer.end == 6
+    assert not buffer.open
+
+
+def test_chunk_longer_than_ring_continues_open_line():
+    buffer = OutputBuffer(max_lines=3)
+    buffer.append('stdout', "a")
+    buffer.append('stdout', "b\n2\n3\n4\n5")
+    assert texts(buffer) == ['3', '4', '5']
+    assert buffer.end == 5
+    assert buffer.open
+    buffer.append('stdout', "6\n")
+    assert texts(buffer) == ['3', '4', '56']
+
+
+def test_chunks_match_line_by_line_output():
+    text = "".join(f"line {i}\n" for i in range(50)) + "tail"
+    whole = OutputBuffer(max_lines=7)
+    whole.append('stdout', text)
+    split = OutputBuffer(max_lines=7)
+    for i in range(0, len(text), 5):
+        split.append('stdout', text[i:i + 5])
+    assert texts(whole) == texts(split)
+    assert whole.end == split.end == 51
+
+
+def test_streams_do_not_merge():
+    buffer = OutputBuffer()
+    buffer.append('stdout', "out")
+    buffer.append('stderr', "err\n")
+    assert buffer.window(buffer.end, 10) == [('stdout', 'out'), ('stderr', 'err')]
+    assert buffer.has_errors
@@ -0,0 +1,261 @@
+from file_loader import MappedChunk
+
+CHUNK_SIZE = 512
+
+
+class TextBuffer:
+    # Документ хранится как последовательность блоков строк (rope из строк).
+    # Дерево Фенвика по длинам блоков находит строку за O(log n), а вставка и
+    # удаление строк затрагивают только один блок.
+    def __init__(self, lines=None):
+        self.version = 0
+        # Отображенный файл, из которого читаются блоки MappedChunk
+        self.mapped = None
+        self.set_lines(lines if lines is not None else [""])
+
+    def set_lines(self, lines):
+        lines = list(lines) or [""]
+        self.chunks = [lines[i:i + CHUNK_SIZE] for i in range(0, len(lines), CHUNK_SIZE)]
+        self.chunk_texts = [None] * len(self.chunks)
+        self.rebuild_index()
+        self.changed()
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(text.split('\n'))
+
+    @classmethod
+    def from_mapped(cls, mapped):
+        # Блоки ссылаются на диапазоны строк отображенного файла и
+        # декодируются при первом обращении
+        buffer = cls()
+        buffer.mapped = mapped
+        line_count = len(mapped)
+        buffer.chunks = [MappedChunk(mapped, i, min(i + CHUNK_SIZE, line_count))
+                         for i in range(0, line_count, CHUNK_SIZE)]
+        buffer.chunk_texts = [None] * len(buffer.chunks)
+        buffer.rebuild_index()
+        buffer.changed()
+        return buffer
+
+    def changed(self):
+        self.version += 1
+        self.cached_text = None
+
+    # Индекс строк
+
+    def rebuild_index(self):
+        n = len(self.chunks)
+        tree = [0] * (n + 1)
+        for i, chunk in enumerate(self.chunks):
+            j = i + 1
+            tree[j] += len(chunk)
+            k = j + (j & -j)
+            if k <= n:
+                tree[k] += tree[j]
+        self.tree = tree
+        self.line_count = sum(len(chunk) for chunk in self.chunks)
+        self.top_bit = 1 << (n.bit_length() - 1) if n else 0
+
+    def update_index(self, chunk_idx, delta):
+        j = chunk_idx + 1
+        n = len(self.chunks)
+        while j <= n:
+            self.tree[j] += delta
+            j += j & -j
+        self.line_count += delta
+        self.chunk_texts[chunk_idx] = None
+
+    def locate(self, row):
+        # Возвращает (номер блока, смещение строки в блоке)
+        pos = 0
+        remaining = row
+        step = self.top_bit
+        n = len(self.chunks)
+        while step:
+            nxt = pos + step
+            if nxt <= n and self.tree[nxt] <= remaining:
+                pos = nxt
+                remaining -= self.tree[nxt]
+            step >>= 1
+        if pos == n:
+            # Позиция сразу после последней строки
+            return n - 1, len(self.chunks[-1])
+        return pos, remaining
+
+    def chunk(self, chunk_idx):
+        chunk = self.chunks[chunk_idx]
+        if not isinstance(chunk, list):
+            chunk = self.chunks[chunk_idx] = chunk.materialize()
+        return chunk
+
+    def normalize_row(self, row):
+        if row < 0:
+            row += self.line_count
+        if not 0 <= row < self.line_count:
+            raise IndexError("line index out of range")
+        return row
+
+    def replace_chunks(self, start, end, new_chunks):
+        self.chunks[start:end] = new_chunks
+        self.chunk_texts[start:end] = [None] * len(new_chunks)
+        self.rebuild_index()
+
+    def split_chunk(self, chunk_idx):
+        chunk = self.chunks[chunk_idx]
+        if len(chunk) > 2 * CHUNK_SIZE:
+            parts = [chunk[i:i + CHUNK_SIZE] for i in range(0, len(chunk), CHUNK_SIZE)]
+            self.replace_chunks(chunk_idx, chunk_idx + 1, parts)
+        elif not chunk and len(self.chunks) > 1:
+            self.replace_chunks(chunk_idx, chunk_idx + 1, [])
+
+    # Интерфейс списка строк
+
+    def __len__(self):
+        return self.line_count
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self.line_count))]
+        chunk_idx, offset = self.locate(self.normalize_row(row))
+        return self.chunk(chunk_idx)[offset]
+
+    def __setitem__(self, row, text):
+        chunk_idx, offset = self.locate(self.normalize_row(row))
+        self.chunk(chunk_idx)[offset] = text
+        self.chunk_texts[chunk_idx] = None
+        self.changed()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def insert(self, row, text):
+        self.insert_lines(row, [text])
+
+    def pop(self, row=-1):
+        return self.delete_lines(self.normalize_row(row), 1)[0]
+
+    def insert_lines(self, row, lines):
+        if not lines:
+            return
+        row = max(0, min(row, self.line_count))
+        chunk_idx, offset = self.locate(row)
+        chunk = self.chunk(chunk_idx)
+        if len(lines) <= CHUNK_SIZE:
+            chunk[offset:offset] = lines
+            self.update_index(chunk_idx, len(lines))
+            self.split_chunk(chunk_idx)
+        else:
+            # Большая вставка (вставка из буфера, загрузка) добавляет новые блоки
+            lines = list(lines)
+            new_chunks = [chunk[:offset]]
+            new_chunks += [lines[i:i + CHUNK_SIZE] for i in range(0, len(lines), CHUNK_SIZE)]
+            new_chunks.append(chunk[offset:])
+            self.replace_chunks(chunk_idx, chunk_idx + 1, [c for c in new_chunks if c])
+        self.changed()
+
+    def delete_lines(self, row, count):
+        removed = []
+        chunk_idx, offset = self.locate(row)
+        while count > 0 and chunk_idx < len(self.chunks):
+            chunk = self.chunk(chunk_idx)
+            part = chunk[offset:offset + count]
+            del chunk[offset:offset + count]
+            removed.extend(part)
+            count -= len(part)
+            self.update_index(chunk_idx, -len(part))
+            chunk_idx += 1
+            offset = 0
+
+        # Пустые блоки удаляются, но в документе всегда остается строка
+        if any(not chunk for chunk in self.chunks):
+            self.replace_chunks(0, len(self.chunks), [c for c in self.chunks if c] or [[""]])
+        self.changed()
+        return removed
+
+    # Правка текста по позициям строка/столбец
+
+    def insert_text(self, row, col, text):
+        line = self[row]
+        parts = text.split('\n')
+        if len(parts) == 1:
+            self[row] = line[:col] + text + line[col:]
+            return row, col + len(text)
+
+        tail = line[col:]
+        self[row] = line[:col] + parts[0]
+        new_lines = parts[1:]
+        end_col = len(new_lines[-1])
+        new_lines[-1] += tail
+        self.insert_lines(row + 1, new_lines)
+        return row + len(new_lines), end_col
+
+    def delete_text(self, row, col, end_row, end_col):
+        if row == end_row:
+            line = self[row]
+            self[row] = line[:col] + line[end_col:]
+            return line[col:end_col]
+
+        first = self[row]
+        last = self[end_row]
+        removed = [first[col:]]
+        removed += self.delete_lines(row + 1, end_row - row)
+        removed[-1] = last[:end_col]
+        self[row] = first[:col] + last[end_col:]
+        return '\n'.join(removed)
+
+    def replace_lines(self, changes):
+        # Пакетная замена строк {row: text}; возвращает прежние тексты.
+        # Строки обходятся по возрастанию одним проходом по блокам
+        old = {}
+        chunk_idx = 0
+        chunk_start = 0
+        for row in sorted(changes, key=self.normalize_row):
+            line_row = self.normalize_row(row)
+            while line_row >= chunk_start + len(self.chunks[chunk_idx]):
+                chunk_start += len(self.chunks[chunk_idx])
+                chunk_idx += 1
+            chunk = self.chunk(chunk_idx)
+            old[row] = chunk[line_row - chunk_start]
+            chunk[line_row - chunk_start] = changes[row]
+            self.chunk_texts[chunk_idx] = None
+        self.changed()
+        return old
+
+    def snapshot(self):
+        # Неизменяемый снимок для фоновой записи: готовые тексты блоков,
+        # копии списков строк и ссылки на непрочитанные блоки файла
+        pieces = []
+        for i, chunk in enumerate(self.chunks):
+            if self.chunk_texts[i] is not None:
+                pieces.append(self.chunk_texts[i])
+            elif isinstance(chunk, list):
+                pieces.append(list(chunk))
+            else:
+                pieces.append(chunk)
+        return pieces
+
+    def materialize(self):
+        # Отвязывает буфер от отображенного файла
+        for i, chunk in enumerate(self.chunks):
+            if not isinstance(chunk, list):
+                self.chunks[i] = chunk.materialize()
+        self.close()
+
+    def close(self):
+        # Закрывает отображение файла; оставшиеся блоки MappedChunk после
+        # этого читать нельзя, поэтому вызывается для буфера, который больше
+        # не нужен, или после materialize()
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+
+    def get_text(self):
+        # Текст собирается лениво и только из измененных блоков
+        if self.cached_text is None:
+            for i, chunk in enumerate(self.chunks):
+                if self.chunk_texts[i] is None:
+                    self.chunk_texts[i] = '\n'.join(chunk) if isinstance(chunk, list) else chunk.text()
+            self.cached_text = '\n'.join(self.chunk_texts)
+        return self.cached_text
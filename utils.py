@@ -0,0 +1,28 @@
+import os
+import json
+
+
+def percentile(values, fraction):
+    # values могут быть не отсортированы; пустой список дает 0
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def read_json(path):
+    # Содержимое файла или None, если его нет или запись оборвалась
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def discard_report(path):
+    # Файл отчета воркера и временный файл его прерванной записи
+    for leftover in (path, path + '.tmp'):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
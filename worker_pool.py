@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import types
+import marshal
+import queue
+import codecs
+import signal
+import threading
+import subprocess
+from collections import deque
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_worker.py')
+READY_MARKER = b'GAME_WORKER_READY\n'
+# В RunResult сохраняется только хвост вывода такого размера
+MAX_CAPTURE_CHARS = 1024 * 1024
+
+
+class RunResult:
+    def __init__(self):
+        self.stdout = ""
+        self.stderr = ""
+        self.truncated = False
+        self.returncode = None
+        self.timed_out = False
+        self.cancelled = False
+        self.error = None
+        self.elapsed = 0.0
+        self.start_kind = None
+        self.start_latency = 0.0
+        # Учет ресурсов процесса (os.wait4); None, если платформа его не дает
+        self.peak_rss = None
+        self.user_time = None
+        self.system_time = None
+        self.exit_reason = None
+
+
+class Worker:
+    def __init__(self, env=None):
+        worker_env = dict(os.environ if env is None else env)
+        worker_env.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+        worker_env.setdefault('PYTHONIOENCODING', 'utf-8')
+        self.spawned_at = time.perf_counter()
+        self.process = subprocess.Popen([sys.executable, '-u', WORKER_SCRIPT],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, env=worker_env)
+        self.ready = False
+
+    def wait_ready(self):
+        # Воркер сообщает о готовности после импорта pygame
+        if not self.ready:
+            marker = self.process.stdout.readline()
+            if marker != READY_MARKER:
+                self.kill()
+                raise RuntimeError("Worker failed to start")
+            self.ready = True
+
+    def encode_job(self, code, header=None):
+        # Уже скомпилированный код передается как marshal, чтобы воркер
+        # не компилировал его повторно
+        header = dict(header or {})
+        if isinstance(code, types.CodeType):
+            payload = marshal.dumps(code)
+            header['format'] = 'marshal'
+        else:
+            payload = code.encode('utf-8')
+        header['size'] = len(payload)
+        return json.dumps(header).encode('utf-8') + b'\n' + payload
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+
+
+class Execution:
+    # Запуск в фоновом потоке: вывод воркера читается по мере появления и
+    # складывается в очередь, которую UI разбирает каждый кадр
+    def __init__(self, pool, code, timeout=5, header=None):
+        self.limits = (header or {}).get('limits') or {}
+        # Живая сессия: stdin воркера остается открытым как канал патчей
+        self.live = bool((header or {}).get('live'))
+        self.stdin_lock = threading.Lock()
+        self.job_sent = threading.Event()
+        self.output = queue.Queue()
+        self.result = RunResult()
+        self.worker = None
+        self.cancelled = False
+        self.started_at = time.perf_counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(pool, code, timeout, header), daemon=True)
+        self.thread.start()
+
+    def run(self, pool, code, timeout, header):
+        result = self.result
+        try:
+            worker, result.start_kind, result.start_latency = pool.acquire()
+            self.worker = worker
+            if self.cancelled:
+                worker.kill()
+
+            readers = [
+                threading.Thread(target=self.read_stream, args=(worker.process.stdout, 'stdout'), daemon=True),
+                threading.Thread(target=self.read_stream, args=(worker.process.stderr, 'stderr'), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+
+            try:
+                with self.stdin_lock:
+                    worker.process.stdin.write(worker.encode_job(code, header))
+                    if self.live:
+                        worker.process.stdin.flush()
+                    else:
+                        worker.process.stdin.close()
+            except OSError:
+                # Воркер уже завершен (например, запуск отменен)
+                pass
+            self.job_sent.set()
+
+            if hasattr(os, 'wait4'):
+                # wait4 вместе с кодом возврата отдает rusage процесса
+                waiter = threading.Thread(target=self.wait_process, args=(worker,), daemon=True)
+                waiter.start()
+                waiter.join(timeout)
+                if waiter.is_alive():
+                    result.timed_out = True
+                    worker.kill()
+                    waiter.join()
+            else:
+                try:
+                    worker.process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    result.timed_out = True
+                    worker.kill()
+                    worker.process.wait()
+
+            for reader in readers:
+                reader.join()
+            result.returncode = worker.process.returncode
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            if self.live and self.worker:
+                with self.stdin_lock:
+                    try:
+                        self.worker.process.stdin.close()
+                    except OSError:
+                        pass
+            result.cancelled = self.cancelled
+            result.elapsed = time.perf_counter() - self.started_at
+            result.exit_reason = self.exit_reason(result)
+            self.done.set()
+
+    def wait_process(self, worker):
+        process = worker.process
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Процесс уже собрал Popen.poll() (например, при отмене)
+            process.wait()
+            return
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss в Linux в килобайтах, в macOS - в байтах
+        scale = 1 if sys.platform == 'darwin' else 1024
+        self.result.peak_rss = usage.ru_maxrss * scale
+        self.result.user_time = usage.ru_utime
+        self.result.system_time = usage.ru_stime
+
+    def exit_reason(self, result):
+        if result.error:
+            return 'error'
+        if result.cancelled:
+            return 'cancelled'
+        if result.timed_out:
+            return 'timeout'
+        code = result.returncode
+        if code == 0:
+            return 'ok'
+        if code is None:
+            return 'unknown'
+        if code < 0:
+            sig = -code
+            cpu_limit = self.limits.get('cpu_seconds')
+            cpu_used = (result.user_time or 0) + (result.system_time or 0)
+            if sig == getattr(signal, 'SIGXCPU', None) or (cpu_limit and sig == signal.SIGKILL and cpu_used >= cpu_limit):
+                return 'cpu limit'
+            try:
+                return f'signal {signal.Signals(sig).name}'
+            except ValueError:
+                return f'signal {sig}'
+        # Исчерпание лимитов памяти и файлов видно по исключению в stderr
+        tail = result.stderr[-2000:]
+        if self.limits.get('memory_bytes') and 'MemoryError' in tail:
+            return 'memory limit'
+        if self.limits.get('open_files') and 'Too many open files' in tail:
+            return 'open files limit'
+        return f'exit code {code}'
+
+    def read_stream(self, stream, name):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        parts = deque()
+        size = 0
+        for chunk in iter(lambda: stream.read1(4096), b''):
+            text = decoder.decode(chunk)
+            if text:
+                parts.append(text)
+                size += len(text)
+                self.output.put((name, text))
+                # Болтливая игра не должна раздувать память редактора
+                while size - len(parts[0]) >= MAX_CAPTURE_CHARS:
+                    size -= len(parts.popleft())
+                    self.result.truncated = True
+        text = decoder.decode(b'', final=True)
+        if text:
+            parts.append(text)
+            self.output.put((name, text))
+        setattr(self.result, name, ''.join(parts))
+
+    def send(self, code):
+        # Новая версия кода для живой сессии; False, если воркер ее не примет
+        if not self.live or not self.job_sent.is_set() or self.done.is_set():
+            return False
+        with self.stdin_lock:
+            try:
+                self.worker.process.stdin.write(self.worker.encode_job(code))
+                self.worker.process.stdin.flush()
+            except (OSError, ValueError):
+                return False
+        return True
+
+    def poll_output(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.output.get_nowait())
+            except queue.Empty:
+                return chunks
+
+    def elapsed(self):
+        if self.done.is_set():
+            return self.result.elapsed
+        return time.perf_counter() - self.started_at
+
+    def cancel(self):
+        self.cancelled = True
+        if self.worker:
+            self.worker.kill()
+
+    def wait(self):
+        self.done.wait()
+        return self.result
+
+
+class WorkerPool:
+    def __init__(self, size=1, env=None):
+        self.size = size
+        self.env = env
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.latencies = {'cold': deque(maxlen=100), 'warm': deque(maxlen=100)}
+        self.fill()
+
+    def fill(self):
+        # Заранее запускаем воркеры, чтобы следующий запуск был "теплым"
+        with self.lock:
+            while len(self.idle) < self.size:
+                self.idle.append(Worker(self.env))
+
+    def acquire(self):
+        with self.lock:
+            worker = self.idle.popleft() if self.idle else None
+
+        kind = 'warm'
+        if worker is None:
+            kind = 'cold'
+            worker = Worker(self.env)
+
+        start = time.perf_counter()
+        worker.wait_ready()
+        latency = time.perf_counter() - start
+        if kind == 'cold':
+            latency = time.perf_counter() - worker.spawned_at
+        self.latencies[kind].append(latency)
+
+        self.fill()
+        return worker, kind, latency
+
+    def start(self, code, timeout=5, header=None):
+        return Execution(self, code, timeout, header)
+
+    def run(self, code, timeout=5, header=None):
+        return self.start(code, timeout, header).wait()
+
+    def latency_report(self):
+        report = {}
+        for kind, samples in self.latencies.items():
+            report[kind] = {
+                'count': len(samples),
+                'mean': sum(samples) / len(samples) if samples else 0.0,
+                'last': samples[-1] if samples else 0.0,
+            }
+        return report
+
+    def shutdown(self):
+        with self.lock:
+            while self.idle:
+                self.idle.popleft().kill()
+            self.size = 0